@@ -14,10 +14,12 @@ try:
     # baseclient and this client are in a package
     from cobrakbase.Workspace.baseclient import (
         BaseClient as _BaseClient,
+        DEFAULT_POOL_SIZE,
     )  # @UnusedImport
 except ImportError:
     # no they aren't
     from baseclient import BaseClient as _BaseClient  # @Reimport
+    from baseclient import DEFAULT_POOL_SIZE  # @Reimport
 
 
 class AbstractHandle(object):
@@ -31,6 +33,10 @@ class AbstractHandle(object):
         ignore_authrc=False,
         trust_all_ssl_certificates=False,
         auth_svc="https://ci.kbase.us/services/auth/api/legacy/KBase/Sessions/Login",
+        session=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        retry_policy=None,
+        hooks=None,
     ):
         if url is None:
             raise ValueError("A url is required")
@@ -44,6 +50,10 @@ class AbstractHandle(object):
             ignore_authrc=ignore_authrc,
             trust_all_ssl_certificates=trust_all_ssl_certificates,
             auth_svc=auth_svc,
+            session=session,
+            pool_size=pool_size,
+            retry_policy=retry_policy,
+            hooks=hooks,
         )
 
     def persist_handle(self, handle, context=None):
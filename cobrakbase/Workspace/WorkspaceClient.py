@@ -11,6 +11,7 @@ from __future__ import print_function
 # the following is a hack to get the baseclient to import whether we're in a
 # package or not. This makes pep8 unhappy hence the annotations.
 from cobrakbase.Workspace.baseclient import BaseClient as _BaseClient
+from cobrakbase.Workspace.baseclient import DEFAULT_POOL_SIZE
 
 # try:
 #    # baseclient and this client are in a package
@@ -31,6 +32,10 @@ class Workspace(object):
         ignore_authrc=False,
         trust_all_ssl_certificates=False,
         auth_svc="https://kbase.us/services/authorization/Sessions/Login",
+        session=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        retry_policy=None,
+        hooks=None,
     ):
         if url is None:
             raise ValueError("A url is required")
@@ -44,6 +49,10 @@ class Workspace(object):
             ignore_authrc=ignore_authrc,
             trust_all_ssl_certificates=trust_all_ssl_certificates,
             auth_svc=auth_svc,
+            session=session,
+            pool_size=pool_size,
+            retry_policy=retry_policy,
+            hooks=hooks,
         )
 
     def ver(self, context=None):
@@ -1980,6 +1989,19 @@ class Workspace(object):
             "Workspace.get_objects2", [params], self._service_ver, context
         )
 
+    def get_objects2_stream(self, params, context=None):
+        """
+        Same as get_objects2 but the response is parsed incrementally (requires ijson),
+        yields each element of data (None for errors with ignoreErrors) once it is parsed.
+        """
+        return self._client.call_method_stream(
+            "Workspace.get_objects2",
+            [params],
+            "result.item.data.item",
+            self._service_ver,
+            context,
+        )
+
     def get_object_subset(self, sub_object_ids, context=None):
         """
         DEPRECATED
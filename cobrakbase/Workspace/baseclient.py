@@ -9,6 +9,7 @@ from __future__ import print_function
 
 import json as _json
 import requests as _requests
+from requests.adapters import HTTPAdapter as _HTTPAdapter
 import random as _random
 import os as _os
 
@@ -22,11 +23,27 @@ try:
 except ImportError:
     from urlparse import urlparse as _urlparse  # py2
 import time
+from cobrakbase.Workspace.instrumentation import CallRecord, emit
 
 _CT = "content-type"
 _AJ = "application/json"
 _URL_SCHEME = frozenset(["http", "https"])
 
+DEFAULT_POOL_SIZE = 10
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Create a keep-alive HTTP session that keeps up to pool_size open connections
+    per host. The session can be shared between clients and threads, connections
+    are checked out of the pool (urllib3) for the duration of each request.
+    """
+    session = _requests.Session()
+    adapter = _HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 def _get_token(user_id, password, auth_svc):
     # This is bandaid helper function until we get a full
@@ -132,6 +149,13 @@ class BaseClient(object):
     lookup_url - set to true when contacting KBase dynamic services.
     async_job_check_time_ms - the wait time between checking job state for
         asynchronous jobs run with the run_job method.
+    session - a requests.Session (see create_session) shared with other clients.
+        If not set a new pooled session is created for this client.
+    pool_size - number of keep-alive connections kept by the created session.
+    retry_policy - a cobrakbase.Workspace.retry.RetryPolicy applied to every call.
+        If not set calls are made once.
+    hooks - callables receiving a cobrakbase.Workspace.instrumentation.CallRecord
+        (method, wall time, bytes, decode time, retries, error code) after each call.
     """
 
     def __init__(
@@ -148,6 +172,10 @@ class BaseClient(object):
         async_job_check_time_ms=100,
         async_job_check_time_scale_percent=150,
         async_job_check_max_time_ms=300000,
+        session=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        retry_policy=None,
+        hooks=None,
     ):
         if url is None:
             raise ValueError("A url is required")
@@ -162,6 +190,9 @@ class BaseClient(object):
         self.async_job_check_time = async_job_check_time_ms / 1000.0
         self.async_job_check_time_scale_percent = async_job_check_time_scale_percent
         self.async_job_check_max_time = async_job_check_max_time_ms / 1000.0
+        self.session = session if session is not None else create_session(pool_size)
+        self.retry_policy = retry_policy
+        self.hooks = list(hooks or [])
         # token overrides user_id and password
         if token is not None:
             self._headers["AUTHORIZATION"] = token
@@ -184,7 +215,7 @@ class BaseClient(object):
         if self.timeout < 1:
             raise ValueError("Timeout value must be at least 1 second")
 
-    def _call(self, url, method, params, context=None):
+    def _build_body(self, method, params, context=None):
         arg_hash = {
             "method": method,
             "params": params,
@@ -196,14 +227,29 @@ class BaseClient(object):
                 raise ValueError("context is not type dict as required.")
             arg_hash["context"] = context
 
-        body = _json.dumps(arg_hash, cls=_JSONObjectEncoder)
-        ret = _requests.post(
-            url,
-            data=body,
-            headers=self._headers,
-            timeout=self.timeout,
-            verify=not self.trust_all_ssl_certificates,
-        )
+        return _json.dumps(arg_hash, cls=_JSONObjectEncoder)
+
+    def _call(self, url, method, params, context=None):
+        body = self._build_body(method, params, context)
+        if not self.hooks:
+            return self._send(self._post, url, body, method)
+        record = CallRecord(method, url, len(body))
+        error = None
+        try:
+            return self._send(self._post, url, body, method, record)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            record.finish(error)
+            emit(self.hooks, record)
+
+    def _send(self, post, url, body, method, record=None):
+        if self.retry_policy is None:
+            return post(url, body, record)
+        return self.retry_policy.call(post, url, body, record, description=method)
+
+    def _check_response(self, ret):
         ret.encoding = "utf-8"
         if ret.status_code == 500:
             if ret.headers.get(_CT) == _AJ:
@@ -216,7 +262,26 @@ class BaseClient(object):
                 raise ServerError("Unknown", 0, ret.text)
         if not ret.ok:
             ret.raise_for_status()
-        resp = ret.json()
+
+    def _post(self, url, body, record=None):
+        if record:
+            record.attempts += 1
+        ret = self.session.post(
+            url,
+            data=body,
+            headers=self._headers,
+            timeout=self.timeout,
+            verify=not self.trust_all_ssl_certificates,
+        )
+        if record:
+            record.bytes_received = len(ret.content)
+        self._check_response(ret)
+        if record:
+            start = time.perf_counter()
+            resp = ret.json()
+            record.add_decode_time(time.perf_counter() - start)
+        else:
+            resp = ret.json()
         if "result" not in resp:
             raise ServerError("Unknown", 0, "An unknown server error occurred")
         if not resp["result"]:
@@ -225,6 +290,53 @@ class BaseClient(object):
             return resp["result"][0]
         return resp["result"]
 
+    def _open_stream(self, url, body, record=None):
+        if record:
+            record.attempts += 1
+        ret = self.session.post(
+            url,
+            data=body,
+            headers=self._headers,
+            timeout=self.timeout,
+            verify=not self.trust_all_ssl_certificates,
+            stream=True,
+        )
+        try:
+            # error responses are small and read whole
+            self._check_response(ret)
+        except Exception:
+            ret.close()
+            raise
+        return ret
+
+    def _call_stream(self, url, method, params, prefix, context=None):
+        try:
+            import ijson
+        except ImportError:
+            raise ImportError(
+                "streaming requires ijson: pip install cobrakbase[stream]"
+            )
+
+        body = self._build_body(method, params, context)
+        record = CallRecord(method, url, len(body)) if self.hooks else None
+        error = None
+        try:
+            # only opening the response is retried, items already yielded can not be undone
+            ret = self._send(self._open_stream, url, body, method, record)
+            with ret:
+                ret.raw.decode_content = True
+                for item in ijson.items(ret.raw, prefix, use_float=True):
+                    yield item
+                if record and hasattr(ret.raw, "tell"):
+                    record.bytes_received = ret.raw.tell()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if record:
+                record.finish(error)
+                emit(self.hooks, record)
+
     def _get_service_url(self, service_method, service_version):
         if not self.lookup_url:
             return self.url
@@ -294,3 +406,15 @@ class BaseClient(object):
         url = self._get_service_url(service_method, service_ver)
         context = self._set_up_context(service_ver, context)
         return self._call(url, service_method, args, context)
+
+    def call_method_stream(
+        self, service_method, args, prefix, service_ver=None, context=None
+    ):
+        """
+        Call a service method parsing the response incrementally (requires ijson).
+        Yields the values found at prefix as soon as each one is parsed, e.g.
+        result.item.data.item for the data elements of get_objects2.
+        """
+        url = self._get_service_url(service_method, service_ver)
+        context = self._set_up_context(service_ver, context)
+        return self._call_stream(url, service_method, args, prefix, context)
@@ -0,0 +1,175 @@
+import json
+import time
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# latency histogram bucket upper bounds in seconds (last bucket is everything above)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def get_error_code(error):
+    """
+    :return: JSON-RPC error code, HTTP status or exception class name
+    """
+    code = getattr(error, "code", None)
+    if code is not None:
+        return code
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None) is not None:
+        return response.status_code
+    return type(error).__name__
+
+
+class CallRecord:
+    """
+    Measurements of one service call, passed to the hooks of a client when the call ends.
+
+    method: JSON-RPC method (e.g., Workspace.get_objects2) or shock.download/shock.get_node
+    wall_time: seconds from the first request to the end of the call (retries included)
+    bytes_sent / bytes_received: request and response body sizes (None if unknown)
+    decode_time: seconds spent decoding the response JSON (None for streamed responses)
+    retries: attempts after the first one
+    error_code: None on success
+    """
+
+    def __init__(self, method, url=None, bytes_sent=0):
+        self.method = method
+        self.url = url
+        self.bytes_sent = bytes_sent
+        self.bytes_received = None
+        self.decode_time = None
+        self.attempts = 0
+        self.error_code = None
+        self.start = time.perf_counter()
+        self.wall_time = None
+
+    @property
+    def retries(self):
+        return max(0, self.attempts - 1)
+
+    def add_received(self, n):
+        self.bytes_received = (self.bytes_received or 0) + n
+
+    def add_decode_time(self, seconds):
+        self.decode_time = (self.decode_time or 0) + seconds
+
+    def finish(self, error=None):
+        self.wall_time = time.perf_counter() - self.start
+        if error is not None:
+            self.error_code = get_error_code(error)
+
+    def to_dict(self):
+        return {
+            "method": self.method,
+            "url": self.url,
+            "wall_time": self.wall_time,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "decode_time": self.decode_time,
+            "retries": self.retries,
+            "error_code": self.error_code,
+        }
+
+
+def emit(hooks, record):
+    for hook in hooks:
+        try:
+            hook(record)
+        except Exception as e:
+            # instrumentation must never break a call
+            logger.warning("instrumentation hook %s failed: %s", hook, e)
+
+
+class _MethodStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.retries = 0
+        self.wall_time = 0.0
+        self.max_wall_time = 0.0
+        self.decode_time = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, record):
+        self.calls += 1
+        self.retries += record.retries
+        if record.error_code is not None:
+            code = str(record.error_code)
+            self.errors[code] = self.errors.get(code, 0) + 1
+        self.wall_time += record.wall_time
+        self.max_wall_time = max(self.max_wall_time, record.wall_time)
+        self.decode_time += record.decode_time or 0
+        self.bytes_sent += record.bytes_sent or 0
+        self.bytes_received += record.bytes_received or 0
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, record.wall_time)] += 1
+
+    def to_dict(self):
+        labels = [f"<={b}" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        return {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "wall_time": self.wall_time,
+            "mean_wall_time": self.wall_time / self.calls if self.calls else 0,
+            "max_wall_time": self.max_wall_time,
+            "decode_time": self.decode_time,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            # bytes received per second of call time
+            "throughput": self.bytes_received / self.wall_time if self.wall_time else 0,
+            "latency_histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class CallStatsAggregator:
+    """
+    Hook aggregating CallRecords per method: call and error counts, retries, wall and decode
+    time, bytes, throughput and latency histograms.
+
+        stats = CallStatsAggregator()
+        api = KBaseAPI(hooks=[stats])
+        ...
+        stats.dump("stats.json")
+    """
+
+    def __init__(self, keep_records=False):
+        """
+
+        :param keep_records: also keep every CallRecord (in self.records)
+        """
+        self.keep_records = keep_records
+        self.records = []
+        self._methods = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            if record.method not in self._methods:
+                self._methods[record.method] = _MethodStats()
+            self._methods[record.method].add(record)
+            if self.keep_records:
+                self.records.append(record)
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+            self.records = []
+            self._started = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            methods = {k: v.to_dict() for k, v in self._methods.items()}
+        return {"elapsed": time.time() - self._started, "methods": methods}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def dump(self, path):
+        with open(path, "w") as fh:
+            fh.write(self.to_json(indent=2))
@@ -0,0 +1,248 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+import requests
+from cobrakbase.Workspace.baseclient import ServerError
+
+logger = logging.getLogger(__name__)
+
+# ServerError codes worth retrying, 0 is used for non JSON-RPC 500 responses
+# (proxy errors, gateway timeouts, service restarts)
+RETRYABLE_CODES = frozenset([0])
+RETRYABLE_HTTP_STATUS = frozenset([429, 502, 503, 504])
+# calls that are not safe to repeat: a request applied by the server before the connection
+# failed would save a duplicate version, copy or handle
+NON_IDEMPOTENT_METHODS = frozenset(
+    [
+        "Workspace.save_objects",
+        "Workspace.save_object",
+        "Workspace.copy_object",
+        "Workspace.revert_object",
+        "AbstractHandle.persist_handle",
+    ]
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Call refused because the service failed too many times in a row
+    """
+
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a service after failure_threshold consecutive transient failures.
+    After reset_timeout seconds one trial call is let through, if it succeeds the
+    circuit closes again otherwise it stays open for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f"circuit open after {self._failures} consecutive failures"
+                )
+            # half open: let this call through and restart the timer for the others
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(
+                        "opening circuit after %d consecutive failures", self._failures
+                    )
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Retry transient RPC failures with exponential backoff and full jitter within a
+    total time budget. A policy (and its circuit breaker) can be shared by many clients.
+
+    Calls to non_idempotent_methods are only retried when the server did not process the
+    request (connection not established, HTTP 429), a timeout or a dropped connection
+    may happen after the server applied it.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        base_delay=0.5,
+        max_delay=30.0,
+        max_total_time=120.0,
+        jitter=True,
+        retryable_codes=RETRYABLE_CODES,
+        retryable_http_status=RETRYABLE_HTTP_STATUS,
+        circuit_breaker=None,
+        retryable_exceptions=(requests.ConnectionError, requests.Timeout),
+        non_idempotent_methods=NON_IDEMPOTENT_METHODS,
+    ):
+        """
+
+        :param max_attempts: maximum number of attempts (1 disables retries)
+        :param base_delay: delay in seconds before the first retry
+        :param max_delay: cap of a single delay in seconds
+        :param max_total_time: total time budget in seconds for all attempts
+        :param jitter: randomize delays between 0 and the backoff value
+        :param retryable_codes: ServerError codes that are retried
+        :param retryable_http_status: HTTP status codes that are retried
+        :param circuit_breaker: CircuitBreaker or None to disable
+        :param retryable_exceptions: exception types that are always retried
+        :param non_idempotent_methods: methods (call description) only retried if the
+            request was not processed
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_time = max_total_time
+        self.jitter = jitter
+        self.retryable_codes = frozenset(retryable_codes)
+        self.retryable_http_status = frozenset(retryable_http_status)
+        self.circuit_breaker = circuit_breaker
+        self.retryable_exceptions = tuple(retryable_exceptions)
+        self.non_idempotent_methods = frozenset(non_idempotent_methods)
+
+    def is_retryable(self, error):
+        if isinstance(error, ServerError):
+            return error.code in self.retryable_codes
+        if isinstance(error, requests.HTTPError):
+            return (
+                error.response is not None
+                and error.response.status_code in self.retryable_http_status
+            )
+        if isinstance(error, self.retryable_exceptions):
+            return True
+        # HTTP errors of other clients (e.g., aiohttp.ClientResponseError)
+        return getattr(error, "status", None) in self.retryable_http_status
+
+    @staticmethod
+    def is_unprocessed(error):
+        """
+        :return: True if the request surely did not reach the service
+        """
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", getattr(error, "status", None))
+        return status == 429
+
+    def get_delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2**attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def _before_attempt(self):
+        if self.circuit_breaker:
+            self.circuit_breaker.before_call()
+
+    def _on_success(self):
+        if self.circuit_breaker:
+            self.circuit_breaker.record_success()
+
+    def _on_failure(self, error, attempt, start, description):
+        """
+        Book-keeping of a failed attempt, re-raises the error if it should not be retried.
+
+        :return: delay in seconds before the next attempt
+        """
+        if not self.is_retryable(error):
+            # the service answered, it is not overloaded
+            self._on_success()
+            raise error
+        if description in self.non_idempotent_methods and not self.is_unprocessed(
+            error
+        ):
+            if self.circuit_breaker:
+                self.circuit_breaker.record_failure()
+            logger.warning("%s failed, not retried: %s", description, error)
+            raise error
+        if self.circuit_breaker:
+            self.circuit_breaker.record_failure()
+        delay = self.get_delay(attempt - 1)
+        elapsed = time.monotonic() - start
+        if attempt >= self.max_attempts or elapsed + delay > self.max_total_time:
+            logger.warning(
+                "%s failed after %d attempts (%.1fs): %s",
+                description,
+                attempt,
+                elapsed,
+                error,
+            )
+            raise error
+        logger.warning(
+            "%s failed (attempt %d/%d): %s. Retrying in %.2fs",
+            description,
+            attempt,
+            self.max_attempts,
+            error,
+            delay,
+        )
+        return delay
+
+    def call(self, fn, *args, description=None, **kwargs):
+        """
+        Call fn(*args, **kwargs) retrying transient failures.
+
+        :param fn: function to call
+        :param description: name used in log messages
+        :return: the value returned by fn
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            self._before_attempt()
+            attempt += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._on_failure(e, attempt, start, description or fn))
+                continue
+            self._on_success()
+            return result
+
+    async def acall(self, fn, *args, description=None, **kwargs):
+        """
+        Await fn(*args, **kwargs) retrying transient failures, asyncio version of call.
+
+        :param fn: coroutine function to call
+        :param description: name used in log messages
+        :return: the value returned by fn
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            self._before_attempt()
+            attempt += 1
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt, start, description or fn)
+                await asyncio.sleep(delay)
+                continue
+            self._on_success()
+            return result
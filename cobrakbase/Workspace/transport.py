@@ -0,0 +1,213 @@
+import io
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayMissError(Exception):
+    """
+    Request not found in the replay store
+    """
+
+    pass
+
+
+def request_key(method, params):
+    """
+    Identity of a JSON-RPC call: method and canonical JSON of its params (the random
+    request id is ignored).
+    """
+    content = json.dumps([method, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def _parse_body(data):
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    body = json.loads(data)
+    return body["method"], body.get("params")
+
+
+def build_response(url, status_code, content, content_type="application/json"):
+    """
+    Build a requests.Response from recorded content, readable whole or streamed.
+    """
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers["content-type"] = content_type
+    response._content = content
+    response.raw = io.BytesIO(content)
+    response.encoding = "utf-8"
+    return response
+
+
+class Transport:
+    """
+    Wraps a requests.Session (or another transport), transports are passed as the session of
+    BaseClient, KBaseAPI or ShockClient. Calls other than post are forwarded.
+    """
+
+    def __init__(self, session=None):
+        if session is None:
+            from cobrakbase.Workspace.baseclient import create_session
+
+            session = create_session()
+        self.session = session
+
+    def post(self, url, data=None, **kwargs):
+        return self.session.post(url, data=data, **kwargs)
+
+    def __getattr__(self, name):
+        # get, mount, close, ... of the wrapped session
+        if name.startswith("_") or name == "session":
+            raise AttributeError(name)
+        return getattr(self.session, name)
+
+
+class RecordingTransport(Transport):
+    """
+    Records every JSON-RPC request and response to a JSON lines file:
+    {"key": ..., "method": ..., "status": ..., "content_type": ..., "body": ...}
+    """
+
+    def __init__(self, path, session=None):
+        """
+
+        :param path: JSON lines file, appended to if it exists
+        :param session: session used for the calls
+        """
+        super().__init__(session)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, **kwargs):
+        response = self.session.post(url, data=data, **kwargs)
+        method, params = _parse_body(data)
+        if kwargs.get("stream"):
+            # read the body to record it, the caller still gets a streamable response
+            content = response.content
+            response = build_response(
+                url,
+                response.status_code,
+                content,
+                response.headers.get("content-type", "application/json"),
+            )
+        record = {
+            "key": request_key(method, params),
+            "method": method,
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", "application/json"),
+            "body": response.content.decode("utf-8"),
+        }
+        with self._lock:
+            with open(self.path, "a") as fh:
+                fh.write(json.dumps(record) + "\n")
+        return response
+
+
+class ReplayTransport(Transport):
+    """
+    Answers JSON-RPC calls from a file written by RecordingTransport without network access.
+    Repeated calls get the recorded responses in order, the last one is repeated.
+    """
+
+    def __init__(self, path):
+        """
+
+        :param path: JSON lines file written by RecordingTransport
+        """
+        self.session = None
+        self.path = path
+        self._records = {}
+        self._lock = threading.Lock()
+        with open(path, "r") as fh:
+            for line in fh:
+                if line.strip():
+                    record = json.loads(line)
+                    self._records.setdefault(record["key"], []).append(record)
+
+    def post(self, url, data=None, **kwargs):
+        method, params = _parse_body(data)
+        key = request_key(method, params)
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                raise ReplayMissError(f"{method} call not found in {self.path}")
+            record = records.pop(0) if len(records) > 1 else records[0]
+        return build_response(
+            url,
+            record["status"],
+            record["body"].encode("utf-8"),
+            record["content_type"],
+        )
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def unavailable(*args, **kwargs):
+            raise ReplayMissError(f"{name} is not available when replaying {self.path}")
+
+        return unavailable
+
+
+class FaultInjectingTransport(Transport):
+    """
+    Adds latency and failures to calls of a session or transport, to test retries, timeouts
+    and error handling.
+    """
+
+    def __init__(
+        self,
+        session=None,
+        latency=0,
+        failure_rate=0.0,
+        failure=503,
+        methods=None,
+        seed=None,
+    ):
+        """
+
+        :param session: wrapped session or transport (e.g., ReplayTransport)
+        :param latency: seconds added to each call or (min, max) range
+        :param failure_rate: probability of failing a call
+        :param failure: HTTP status of failed calls or an exception instance to raise
+            (e.g., requests.ConnectionError())
+        :param methods: only calls to these JSON-RPC methods are affected (default all)
+        :param seed: random seed for reproducible runs
+        """
+        super().__init__(session)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure = failure
+        self.methods = methods
+        self.injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, **kwargs):
+        if self.methods is None or _parse_body(data)[0] in self.methods:
+            with self._lock:
+                latency = self.latency
+                if isinstance(latency, (tuple, list)):
+                    latency = self._random.uniform(*latency)
+                fail = self._random.random() < self.failure_rate
+                if fail:
+                    self.injected += 1
+            if latency:
+                time.sleep(latency)
+            if fail:
+                logger.debug("injected failure %s", self.failure)
+                if isinstance(self.failure, BaseException):
+                    raise self.failure
+                return build_response(
+                    url, self.failure, b"injected failure", "text/plain"
+                )
+        return self.session.post(url, data=data, **kwargs)
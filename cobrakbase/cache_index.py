@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from cobrakbase.kbase_object_info import KBaseObjectInfo
+from cobrakbase.exceptions import CacheIntegrityError
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ref TEXT PRIMARY KEY,
+    ws_uid INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    name TEXT,
+    type TEXT,
+    info TEXT,
+    checksum TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_type ON entries (type);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS entries_checksum ON entries (checksum, codec);
+CREATE TABLE IF NOT EXISTS blobs (
+    checksum TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (checksum, codec)
+);
+"""
+
+
+class CacheIndex:
+    """
+    SQLite index of an ObjectStore: reference, size, type and last access of each entry.
+    The database runs in WAL mode so several processes can share the cache folder, writes
+    that must be consistent (add, evict) run inside BEGIN IMMEDIATE transactions.
+    """
+
+    def __init__(self, store, db_path=None, timeout=60.0):
+        """
+
+        :param store: ObjectStore
+        :param db_path: sqlite file (default {store.path}/index.sqlite)
+        :param timeout: seconds to wait for other processes holding the database lock
+        """
+        self.store = store
+        self.db_path = db_path or os.path.join(store.path, "index.sqlite")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            self.db_path,
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def add(self, ws_uid, uid, version):
+        """
+        Index an entry written to the store.
+        """
+        entry = self.store.read_entry_meta(ws_uid, uid, version)
+        if entry is None:
+            return
+        info = KBaseObjectInfo(entry["info"]) if entry.get("info") else None
+        entry_size = os.path.getsize(self.store.entry_path(ws_uid, uid, version))
+        blob_path = self.store.blob_path(
+            entry["checksum"], self.store._get_codec(entry["codec"])
+        )
+        blob_size = os.path.getsize(blob_path) if os.path.exists(blob_path) else 0
+        now = time.time()
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                (
+                    f"{ws_uid}/{uid}/{version}",
+                    ws_uid,
+                    uid,
+                    version,
+                    info.id if info else None,
+                    info.type if info else None,
+                    json.dumps(entry["info"]) if info else None,
+                    entry["checksum"],
+                    entry["codec"],
+                    entry_size,
+                    now,
+                    now,
+                ),
+            )
+            cur.execute(
+                "INSERT OR IGNORE INTO blobs VALUES (?,?,?)",
+                (entry["checksum"], entry["codec"], blob_size),
+            )
+
+    def touch(self, ws_uid, uid, version):
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE entries SET last_access = ? WHERE ref = ?",
+                (time.time(), f"{ws_uid}/{uid}/{version}"),
+            )
+
+    def total_bytes(self):
+        with self._lock:
+            entries, blobs = self._conn.execute(
+                "SELECT (SELECT COALESCE(SUM(size), 0) FROM entries),"
+                " (SELECT COALESCE(SUM(size), 0) FROM blobs)"
+            ).fetchone()
+        return entries + blobs
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def find(self, object_type=None, workspace=None, name_prefix=None):
+        """
+        Query cached objects.
+
+        :param object_type: object type without version (e.g., KBaseFBA.FBAModel)
+        :param workspace: workspace id
+        :param name_prefix: object name prefix
+        :return: list of KBaseObjectInfo
+        """
+        query = "SELECT info FROM entries WHERE info IS NOT NULL"
+        args = []
+        if object_type:
+            query += " AND type = ?"
+            args.append(object_type)
+        if workspace is not None:
+            query += " AND ws_uid = ?"
+            args.append(workspace)
+        if name_prefix:
+            query += " AND name LIKE ? ESCAPE '\\'"
+            escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%")
+            args.append(escaped.replace("_", "\\_") + "%")
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY ref", args).fetchall()
+        return [KBaseObjectInfo(json.loads(row[0])) for row in rows]
+
+    def _remove_rows(self, cur, refs):
+        """
+        Remove entries and the blobs no longer referenced by any entry.
+
+        :return: dict of orphan blob (checksum, codec) -> blob size
+        """
+        orphans = {}
+        for ref in refs:
+            row = cur.execute(
+                "SELECT checksum, codec FROM entries WHERE ref = ?", (ref,)
+            ).fetchone()
+            if row is None:
+                continue
+            cur.execute("DELETE FROM entries WHERE ref = ?", (ref,))
+            used = cur.execute(
+                "SELECT 1 FROM entries WHERE checksum = ? AND codec = ? LIMIT 1", row
+            ).fetchone()
+            if used is None:
+                size = cur.execute(
+                    "SELECT size FROM blobs WHERE checksum = ? AND codec = ?", row
+                ).fetchone()
+                cur.execute("DELETE FROM blobs WHERE checksum = ? AND codec = ?", row)
+                orphans[row] = size[0] if size else 0
+        return orphans
+
+    def _remove_files(self, refs, orphans):
+        # files are removed after the commit, readers handle missing files as misses
+        for ref in refs:
+            self.store.remove_entry(*map(int, ref.split("/")))
+        for checksum, codec in orphans:
+            self.store.remove_blob(checksum, codec)
+
+    def remove(self, ws_uid, uid, version):
+        ref = f"{ws_uid}/{uid}/{version}"
+        with self._transaction() as cur:
+            orphans = self._remove_rows(cur, [ref])
+        self._remove_files([ref], orphans)
+
+    def evict(self, max_bytes):
+        """
+        Remove least recently used entries until the cache uses at most max_bytes.
+
+        :param max_bytes: byte budget
+        :return: list of evicted references
+        """
+        evicted = []
+        with self._transaction() as cur:
+            total = sum(
+                cur.execute(
+                    "SELECT (SELECT COALESCE(SUM(size), 0) FROM entries),"
+                    " (SELECT COALESCE(SUM(size), 0) FROM blobs)"
+                ).fetchone()
+            )
+            if total <= max_bytes:
+                return evicted
+            rows = cur.execute(
+                "SELECT ref, size FROM entries ORDER BY last_access"
+            ).fetchall()
+            orphans = {}
+            for ref, size in rows:
+                if total <= max_bytes:
+                    break
+                removed = self._remove_rows(cur, [ref])
+                total -= size + sum(removed.values())
+                orphans.update(removed)
+                evicted.append(ref)
+        self._remove_files(evicted, orphans)
+        logger.debug("evicted %d entries", len(evicted))
+        return evicted
+
+    def rebuild(self):
+        """
+        Index every entry found in the store folder (e.g., caches created without index).
+
+        :return: number of indexed entries
+        """
+        count = 0
+        for ws_uid, uid, version in self.store.iter_entries():
+            try:
+                self.add(ws_uid, uid, version)
+            except CacheIntegrityError as e:
+                logger.warning("skipping corrupt entry %s", e)
+                continue
+            count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn.cursor()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
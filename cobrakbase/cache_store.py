@@ -0,0 +1,504 @@
+import io
+import os
+import re
+import time
+import gzip
+import json
+import hashlib
+import logging
+import tarfile
+import tempfile
+import threading
+from cobrakbase.exceptions import CacheIntegrityError
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LOCK_TIMEOUT = 600
+QUARANTINE_FOLDER = "quarantine"
+BUNDLE_INDEX = "index.json"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_BLOB = re.compile(r"^objects/([0-9a-f]{2})/\1[0-9a-f]{30}\.json(\.gz|\.zst)?$")
+
+
+def _import_orjson():
+    try:
+        import orjson
+
+        return orjson
+    except ImportError:
+        return None
+
+
+def _has_zstandard():
+    try:
+        import zstandard
+
+        return True
+    except ImportError:
+        return False
+
+
+# zstd reads and writes several times faster than gzip with better ratios
+DEFAULT_CODEC = "json.zst" if _has_zstandard() else "json.gz"
+
+
+class JSONCodec:
+    """
+    Serializes objects to (optionally compressed) JSON bytes.
+
+    compression: None, gzip or zstd (requires zstandard)
+    json_backend: json or orjson (faster, falls back to json if not installed)
+    """
+
+    def __init__(self, compression="gzip", json_backend="orjson", level=None):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"unknown compression [{compression}]")
+        self.compression = compression
+        self.level = level
+        self._orjson = _import_orjson() if json_backend == "orjson" else None
+        self._zstd = None
+        if compression == "zstd":
+            import zstandard
+
+            self._zstd = zstandard
+
+    @property
+    def name(self):
+        return "json" + COMPRESSION_EXTENSIONS[self.compression]
+
+    @property
+    def extension(self):
+        return "." + self.name
+
+    def dumps(self, obj):
+        if self._orjson is not None:
+            try:
+                return self._orjson.dumps(obj)
+            except TypeError:
+                # orjson rejects non str keys and integers larger than 64 bits
+                pass
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, content):
+        if self._orjson is not None:
+            return self._orjson.loads(content)
+        return json.loads(content)
+
+    def encode(self, obj):
+        content = self.dumps(obj)
+        if self.compression == "gzip":
+            # fixed mtime, the same object always encodes to the same bytes (the digests
+            # of entries sharing a data file stay valid when it is written again)
+            buffer = io.BytesIO()
+            with gzip.GzipFile(
+                fileobj=buffer, mode="wb", compresslevel=self.level or 3, mtime=0
+            ) as fh:
+                fh.write(content)
+            return buffer.getvalue()
+        if self.compression == "zstd":
+            return self._zstd.ZstdCompressor(level=self.level or 3).compress(content)
+        return content
+
+    def decode(self, content):
+        if self.compression == "gzip":
+            content = gzip.decompress(content)
+        elif self.compression == "zstd":
+            content = self._zstd.ZstdDecompressor().decompress(content)
+        return self.loads(content)
+
+
+def get_codec(codec):
+    """
+    Get a codec from its name: json, json.gz or json.zst
+
+    :param codec: JSONCodec or codec name
+    :return: JSONCodec
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if codec == "json" + extension:
+            return JSONCodec(compression)
+    raise ValueError(f"unknown codec [{codec}]")
+
+
+def write_atomic(file_path, content):
+    """
+    Write content to a temporary file in the same folder and rename it to file_path, readers
+    never see a partial file.
+
+    :param file_path:
+    :param content: bytes
+    """
+    folder = os.path.dirname(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(content)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+class EntryLock:
+    """
+    Exclusive lock of a cache entry shared by threads and processes: flock of a lock file,
+    released by the OS if the holding process dies. Without fcntl (windows) only threads of
+    the same process are excluded.
+
+        with EntryLock(path) as locked:
+            ...
+    """
+
+    def __init__(self, lock_path, timeout=DEFAULT_LOCK_TIMEOUT, poll_interval=0.05):
+        """
+
+        :param lock_path: lock file (created if missing)
+        :param timeout: seconds to wait for the lock (None waits forever)
+        :param poll_interval: seconds between attempts while waiting
+        """
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fh = None
+        self._thread_lock = None
+
+    def acquire(self):
+        """
+        :return: True if acquired, False on timeout
+        """
+        if fcntl is None:
+            with _thread_locks_lock:
+                lock = _thread_locks.setdefault(self.lock_path, threading.Lock())
+            if lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+                self._thread_lock = lock
+                return True
+            return False
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        fh = open(self.lock_path, "a")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fh = fh
+                return True
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() > deadline:
+                    fh.close()
+                    return False
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        if self._thread_lock is not None:
+            self._thread_lock.release()
+            self._thread_lock = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ObjectStore:
+    """
+    Content-addressed storage of workspace objects.
+
+    The object data is stored once per checksum under objects/{md5[:2]}/{md5}.json.gz and each
+    object version has a small entry {ws_id}/{obj_id}.v{ver}.entry.json with the workspace
+    fields (info, provenance, refs, ...) pointing to the data checksum.
+    """
+
+    def __init__(self, path, codec=DEFAULT_CODEC):
+        self.path = path
+        self.codec = get_codec(codec)
+        self._codecs = {self.codec.name: self.codec}
+
+    def _get_codec(self, name):
+        if name not in self._codecs:
+            self._codecs[name] = get_codec(name)
+        return self._codecs[name]
+
+    def entry_path(self, ws_uid, uid, version):
+        return os.path.join(self.path, str(ws_uid), f"{uid}.v{version}.entry.json")
+
+    def blob_path(self, checksum, codec=None):
+        codec = codec or self.codec
+        return os.path.join(
+            self.path, "objects", checksum[:2], checksum + codec.extension
+        )
+
+    def lock_entry(self, ws_uid, uid, version, timeout=DEFAULT_LOCK_TIMEOUT):
+        """
+        :return: EntryLock of an entry (lock files are kept under locks/)
+        """
+        lock_path = os.path.join(
+            self.path, "locks", str(ws_uid), f"{uid}.v{version}.lock"
+        )
+        return EntryLock(lock_path, timeout)
+
+    def has_entry(self, ws_uid, uid, version):
+        return os.path.exists(self.entry_path(ws_uid, uid, version))
+
+    def read_entry_meta(self, ws_uid, uid, version):
+        """
+        :return: entry dict (workspace fields, checksum, codec and digest) without data,
+            or None
+        :raises CacheIntegrityError: unreadable entry file
+        """
+        try:
+            with open(self.entry_path(ws_uid, uid, version), "rb") as fh:
+                return json.loads(fh.read())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise CacheIntegrityError(f"{ws_uid}/{uid}/{version}", f"bad entry: {e}")
+
+    def read_entry(self, ws_uid, uid, version, verify=False):
+        """
+        :param verify: check the data file against the md5 digest stored in the entry
+        :return: dict with the workspace fields and data, or None if not stored
+        :raises CacheIntegrityError: corrupt entry or data file
+        """
+        entry = self.read_entry_meta(ws_uid, uid, version)
+        if entry is None:
+            return None
+        codec = self._get_codec(entry.pop("codec"))
+        checksum = entry.pop("checksum")
+        digest = entry.pop("digest", None)
+        try:
+            with open(self.blob_path(checksum, codec), "rb") as fh:
+                content = fh.read()
+        except FileNotFoundError:
+            # evicted by another process after we read the entry
+            return None
+        ref = f"{ws_uid}/{uid}/{version}"
+        if verify and digest and hashlib.md5(content).hexdigest() != digest:
+            raise CacheIntegrityError(ref, f"data {checksum} does not match digest")
+        try:
+            entry["data"] = codec.decode(content)
+        except Exception as e:
+            # truncated files, decompression and JSON errors
+            raise CacheIntegrityError(ref, f"unable to decode data {checksum}: {e}")
+        return entry
+
+    def verify_entry(self, ws_uid, uid, version):
+        """
+        Check an entry: entry file, data file presence, digest and decoding.
+
+        :return: None if valid, else the problem found
+        """
+        try:
+            if self.read_entry(ws_uid, uid, version, verify=True) is None:
+                return "missing entry or data"
+        except CacheIntegrityError as e:
+            return e.message
+        return None
+
+    def _blob_decodes(self, blob_path, codec):
+        try:
+            with open(blob_path, "rb") as fh:
+                codec.decode(fh.read())
+        except FileNotFoundError:
+            return True
+        except Exception:
+            return False
+        return True
+
+    def quarantine_entry(self, ws_uid, uid, version):
+        """
+        Move an entry to quarantine/ for inspection, the entry is no longer served. Its data
+        file is shared by entries with the same checksum and is only moved if it does not
+        decode.
+        """
+        try:
+            entry = self.read_entry_meta(ws_uid, uid, version)
+        except CacheIntegrityError:
+            entry = None
+        paths = [self.entry_path(ws_uid, uid, version)]
+        if entry is not None:
+            codec = self._get_codec(entry["codec"])
+            blob_path = self.blob_path(entry["checksum"], codec)
+            if not self._blob_decodes(blob_path, codec):
+                paths.append(blob_path)
+        for file_path in paths:
+            target = os.path.join(
+                self.path, QUARANTINE_FOLDER, os.path.relpath(file_path, self.path)
+            )
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.replace(file_path, target)
+            except FileNotFoundError:
+                pass
+
+    def remove_entry(self, ws_uid, uid, version):
+        try:
+            os.remove(self.entry_path(ws_uid, uid, version))
+        except FileNotFoundError:
+            pass
+
+    def remove_blob(self, checksum, codec_name):
+        try:
+            os.remove(self.blob_path(checksum, self._get_codec(codec_name)))
+        except FileNotFoundError:
+            pass
+
+    def iter_entries(self):
+        """
+        Walk the store yielding (ws_uid, uid, version) of every entry.
+        """
+        for ws_folder in os.listdir(self.path):
+            if not ws_folder.isdigit():
+                continue
+            for file_name in os.listdir(os.path.join(self.path, ws_folder)):
+                if file_name.endswith(".entry.json"):
+                    uid, version = file_name[: -len(".entry.json")].split(".v")
+                    yield int(ws_folder), int(uid), int(version)
+
+    def _read_blob(self, blob_path, data):
+        """
+        :return: bytes of the data file if it exists and decodes to data, otherwise None
+        """
+        if not os.path.exists(blob_path):
+            return None
+        with open(blob_path, "rb") as fh:
+            content = fh.read()
+        try:
+            if self.codec.decode(content) == data:
+                return content
+        except Exception as e:
+            logger.warning("[%s] unable to decode data file: %s", blob_path, e)
+            return None
+        logger.warning("[%s] data file does not match the data", blob_path)
+        return None
+
+    def write_entry(self, ws_uid, uid, version, ws_data):
+        """
+        Store a get_objects2 data element, the data is only written if no other entry
+        has the same checksum. An existing data file is reused only if it decodes to the
+        same data, a damaged one is replaced.
+
+        :param ws_uid:
+        :param uid:
+        :param version:
+        :param ws_data: get_objects2 data element (dict with data and info)
+        :return: entry file path
+        """
+        entry = {k: v for k, v in ws_data.items() if k != "data"}
+        checksum = None
+        content = None
+        if ws_data.get("info") and len(ws_data["info"]) > 8:
+            checksum = ws_data["info"][8]
+        if not checksum:
+            content = self.codec.encode(ws_data["data"])
+            checksum = hashlib.md5(content).hexdigest()
+        blob_path = self.blob_path(checksum)
+        stored = self._read_blob(blob_path, ws_data["data"])
+        if stored is not None:
+            logger.debug("[%s] data already stored", checksum)
+            content = stored
+        else:
+            if content is None:
+                content = self.codec.encode(ws_data["data"])
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            write_atomic(blob_path, content)
+        entry["checksum"] = checksum
+        entry["codec"] = self.codec.name
+        # digest of the data file bytes, checked on read (see read_entry verify), encoding
+        # is deterministic so rewriting a damaged data file restores the same bytes
+        entry["digest"] = hashlib.md5(content).hexdigest()
+        entry_path = self.entry_path(ws_uid, uid, version)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        write_atomic(entry_path, json.dumps(entry).encode("utf-8"))
+        return entry_path
+
+    def _relative(self, file_path):
+        return os.path.relpath(file_path, self.path).replace(os.sep, "/")
+
+    def export_bundle(self, bundle_path, keys=None):
+        """
+        Write entries and their data to a tar bundle with an index.json listing them, blobs
+        shared by several entries are written once.
+
+        :param bundle_path: tar file
+        :param keys: list of (ws_uid, uid, version) (default every entry)
+        :return: list of exported references
+        """
+        if keys is None:
+            keys = list(self.iter_entries())
+        index = {"format": BUNDLE_FORMAT_VERSION, "entries": []}
+        added = set()
+        with tarfile.open(bundle_path, "w") as tar:
+            for ws_uid, uid, version in keys:
+                entry = self.read_entry_meta(ws_uid, uid, version)
+                if entry is None:
+                    logger.warning("[%s/%s/%s] not stored", ws_uid, uid, version)
+                    continue
+                entry_path = self.entry_path(ws_uid, uid, version)
+                blob_path = self.blob_path(
+                    entry["checksum"], self._get_codec(entry["codec"])
+                )
+                if not os.path.exists(blob_path):
+                    logger.warning("[%s/%s/%s] data missing", ws_uid, uid, version)
+                    continue
+                for file_path in (entry_path, blob_path):
+                    name = self._relative(file_path)
+                    if name not in added:
+                        tar.add(file_path, arcname=name)
+                        added.add(name)
+                index["entries"].append(
+                    {
+                        "ref": f"{ws_uid}/{uid}/{version}",
+                        "entry": self._relative(entry_path),
+                        "blob": self._relative(blob_path),
+                    }
+                )
+            content = json.dumps(index).encode("utf-8")
+            info = tarfile.TarInfo(BUNDLE_INDEX)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+        return [e["ref"] for e in index["entries"]]
+
+    def import_bundle(self, bundle_path):
+        """
+        Store the entries of a bundle written by export_bundle, only files listed in its
+        index are extracted and existing blobs are kept.
+
+        :param bundle_path: tar file
+        :return: list of (ws_uid, uid, version) imported
+        """
+        imported = []
+        with tarfile.open(bundle_path, "r") as tar:
+            index = json.load(tar.extractfile(BUNDLE_INDEX))
+            if index.get("format") != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f"unsupported bundle format {index.get('format')}")
+            for e in index["entries"]:
+                ws_uid, uid, version = map(int, e["ref"].split("/"))
+                entry_name = self._relative(self.entry_path(ws_uid, uid, version))
+                # only extract to paths an entry and a blob of a store would have
+                if e["entry"] != entry_name or not BUNDLE_BLOB.match(e["blob"]):
+                    raise ValueError(f"invalid bundle entry {e}")
+                for name in (e["blob"], e["entry"]):
+                    file_path = os.path.join(self.path, *name.split("/"))
+                    if name == e["blob"] and os.path.exists(file_path):
+                        continue
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    write_atomic(file_path, tar.extractfile(name).read())
+                imported.append((ws_uid, uid, version))
+        return imported
@@ -69,6 +69,7 @@ class KBaseFBAUtilities:
         self.metabolites_remap = {}
         self.solution_exclusion_constraints = []
         self.kbapi = kbapi
+        self.prefetched = {}
         self.potential_variables = dict()
         self.reversibility_binary = dict()
         self.reversibility_binary_constraints = dict()
@@ -978,6 +979,32 @@ class KBaseFBAUtilities:
         self.cobramodel.add_reactions(new_reactions.values())
         return new_penalties
 
+    def prefetch_dependencies(self, max_depth=1, resolver=None):
+        """
+        Fetch the templates referenced by the model in batched calls,
+        temp_extend_model_index_for_gapfilling uses them instead of fetching one at a time.
+
+        :param max_depth: levels of references to follow
+        :param resolver: DependencyResolver shared between models so common templates are
+            fetched once (default a new resolver for the template fields)
+        :return: dict of reference -> object
+        """
+        from cobrakbase.dependency_resolver import (
+            DependencyResolver,
+            MODEL_TEMPLATE_FIELDS,
+        )
+
+        if resolver is None:
+            resolver = DependencyResolver(self.kbapi, fields=MODEL_TEMPLATE_FIELDS)
+        self.prefetched.update(resolver.resolve([self.fbamodel], max_depth))
+        return self.prefetched
+
+    def _get_ws_object(self, ref):
+        o = self.prefetched.get(ref)
+        if o is None or isinstance(o, Exception):
+            return self.kbapi.get_from_ws(ref)
+        return o
+
     # Possible new function to add to the KBaseFBAModelToCobraBuilder to extend a model with a template for gapfilling for a specific index
     def temp_extend_model_index_for_gapfilling(self, index, input_templates=[]):
         new_metabolites = {}
@@ -992,9 +1019,9 @@ class KBaseFBAUtilities:
         elif index in input_templates:
             template = input_templates[index]
         elif index in self.fbamodel["template_refs"]:
-            template = self.kbapi.get_from_ws(self.fbamodel["template_refs"][index])
+            template = self._get_ws_object(self.fbamodel["template_refs"][index])
         else:
-            template = self.kbapi.get_from_ws(self.fbamodel["template_ref"])
+            template = self._get_ws_object(self.fbamodel["template_ref"])
 
         if template.info.type != "KBaseFBA.NewModelTemplate":
             raise ObjectError(
@@ -72,7 +72,7 @@ class KBaseObjectFactory:
             logger.debug("using default KBaseObject builder")
             return KBaseObject(data, info, args, object_type)
 
-    def build_object_from_ws(self, ws_output, object_type):
+    def build_object_from_ws(self, ws_output, object_type, partial=False):
         if ws_output is None:
             return KBaseObject(None, None, None, object_type)
 
@@ -97,12 +97,25 @@ class KBaseObjectFactory:
         info = KBaseObjectInfo(ws_data["info"])
 
         if info and info.type and info.type in self.object_mapper:
-            return self._build_object(info.type, data, info, args)
+            if not partial:
+                return self._build_object(info.type, data, info, args)
+            try:
+                return self._build_object(info.type, data, info, args)
+            except (KeyError, TypeError, AttributeError) as e:
+                # subsets may lack fields the typed builder requires
+                logger.warning(
+                    "unable to build [%s] from partial data (%s), using KBaseObject",
+                    info.type,
+                    e,
+                )
 
         return KBaseObject(data, info, args)
 
-    def create(self, ws_output, object_type):
+    def create(self, ws_output, object_type, partial=False):
         """
-        
+
+        :param ws_output: get_objects2 output
+        :param object_type:
+        :param partial: data is a subset of the object (included paths)
         """
-        return self.build_object_from_ws(ws_output, object_type)
+        return self.build_object_from_ws(ws_output, object_type, partial)
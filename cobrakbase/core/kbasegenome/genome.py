@@ -210,7 +210,7 @@ class KBaseGenome(KBaseObject, MSGenome):
             KBaseGenomeFeature.from_kbase_data(o) for o in kbase_data["features"]
         ]
 
-        cdss = [KBaseGenomeCDS.from_kbase_data(o) for o in kbase_data["cdss"]]
+        cdss = [KBaseGenomeCDS.from_kbase_data(o) for o in kbase_data.get("cdss", [])]
         genome.add_features(features)
         genome.add_cdss(cdss)
 
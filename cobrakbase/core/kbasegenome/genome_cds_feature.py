@@ -294,8 +294,9 @@ class KBaseGenomeFeature(MSFeature):
     def from_kbase_data(kbase_data):
         functions = KBaseGenomeFeature.extract_functions(kbase_data)
         functions_split = KBaseGenomeFeature.split_annotation(functions)
-        protein_translation = kbase_data["protein_translation"]
-        dna_sequence = kbase_data["dna_sequence"]
+        # sequences, location and cdss are absent when fetched with a projection
+        protein_translation = kbase_data.get("protein_translation")
+        dna_sequence = kbase_data.get("dna_sequence")
         if protein_translation:
             protein_translation = protein_translation.upper()
         if dna_sequence:
@@ -304,8 +305,8 @@ class KBaseGenomeFeature(MSFeature):
             kbase_data["id"],
             protein_translation,
             dna_sequence,
-            kbase_data["location"],
-            kbase_data["cdss"],
+            kbase_data.get("location", []),
+            kbase_data.get("cdss", []),
             functions,
             kbase_data.get("aliases")
         )
@@ -3,6 +3,7 @@ from cobra.core.dictlist import DictList
 from cobrakbase.kbase_object_info import KBaseObjectInfo
 from cobrakbase.core.kbasegenome.ortholog_family import OrthologFamily, OrthologItem
 from cobrakbase.core.kbaseobject import KBaseObject
+from cobrakbase.exceptions import WorkspaceObjectError
 
 logger = logging.getLogger(__name__)
 
@@ -42,13 +43,19 @@ class KBasePangenome(KBaseObject):
         self.orthologs += ortholog_list
 
     def load_tax_info(self):
-        for genome_ref in self.data["genome_refs"]:
+        genome_refs = self.data["genome_refs"]
+        for genome_ref in genome_refs:
             self.genome_ref_object_info[genome_ref] = None
-            if self.api:
-                logging.debug(
-                    "[%s] loading genome_ref info from api [%s]", self.id, self.api
-                )
-                info = self.api.get_object_info_from_ref(genome_ref)
+        if self.api:
+            logging.debug(
+                "[%s] loading genome_ref info from api [%s]", self.id, self.api
+            )
+            # one batched get_object_info3 call per KBaseAPI batch instead of one per genome
+            infos = self.api.get_object_infos(genome_refs)
+            for genome_ref, info in zip(genome_refs, infos):
+                if isinstance(info, WorkspaceObjectError):
+                    logger.warning("[%s] %s", self.id, info)
+                    continue
                 self.genome_ref_object_info[genome_ref] = info
                 logging.debug("[%s] %s -> %s", self.id, genome_ref, info.id)
 
@@ -0,0 +1,148 @@
+import re
+import logging
+from cobrakbase.kbaseapi import DEFAULT_BATCH_SIZE, _build_object
+from cobrakbase.core.kbase_object_factory import KBaseObjectFactory
+from cobrakbase.exceptions import WorkspaceObjectError
+
+logger = logging.getLogger(__name__)
+
+# workspace references (ws/obj or ws/obj/ver), excludes sub object references such as
+# ~/template/reactions/id/rxn00001_c or 12998/1/2/compounds/id/cpd00001
+REF_PATTERN = re.compile(r"^[^/~;\s]+/[^/;\s]+(/\d+)?$")
+DEFAULT_MAX_DEPTH = 1
+# references read when extending a model for gapfilling (templates), the gapfilling
+# media is given by the caller
+MODEL_TEMPLATE_FIELDS = [
+    "template_ref",
+    "template_refs",
+    "core_template_ref",
+]
+
+
+def find_refs(data, fields=None):
+    """
+    Walk object data collecting the values of *_ref and *_refs fields that are workspace
+    references (e.g., genome_ref, template_refs, gapfillings media_ref).
+
+    :param data: object data
+    :param fields: only follow these field names (default any *_ref or *_refs field)
+    :return: list of unique references in the order found
+    """
+    found = []
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(x for x in reversed(value) if isinstance(x, (dict, list)))
+            continue
+        if not isinstance(value, dict):
+            continue
+        nested = []
+        for key, v in value.items():
+            if key.endswith("_ref") or key.endswith("_refs"):
+                if fields is None or key in fields:
+                    refs = v if isinstance(v, list) else [v]
+                    found += [
+                        x for x in refs if isinstance(x, str) and REF_PATTERN.match(x)
+                    ]
+            elif isinstance(v, (dict, list)):
+                nested.append(v)
+        stack.extend(reversed(nested))
+    return list(dict.fromkeys(found))
+
+
+class DependencyResolver:
+    """
+    Fetches the objects referenced by workspace objects (genome, templates, media, ...) level by
+    level with batched get_objects2 calls (KBaseAPI.get_from_ws_many). Dependencies are fetched
+    through reference paths (parent;child) so objects only readable through the parent are
+    reachable. Fetched objects are kept, dependencies shared by many roots (e.g., a template
+    used by every model) are fetched once per resolver.
+    """
+
+    def __init__(
+        self,
+        api,
+        max_depth=DEFAULT_MAX_DEPTH,
+        fields=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+    ):
+        """
+
+        :param api: KBaseAPI
+        :param max_depth: levels of references to follow (1 = direct references)
+        :param fields: only follow these reference fields (default any *_ref or *_refs)
+        :param batch_size: maximum number of objects per get_objects2 call
+        """
+        self.api = api
+        self.max_depth = max_depth
+        self.fields = fields
+        self.batch_size = batch_size
+        self.objects = {}
+        self._children = {}
+        self._factory = KBaseObjectFactory()
+
+    def _root_refs(self, root):
+        """
+        :return: tuple (ref path or None, data or None)
+        """
+        if isinstance(root, str):
+            return root, None
+        if isinstance(root, dict):
+            return None, root
+        info = getattr(root, "info", None)
+        return info and info.reference, root.get_data()
+
+    def _fetch(self, frontier):
+        refs = [ref for ref in frontier if ref not in self.objects]
+        if not refs:
+            return
+        logger.debug("fetching %d dependencies", len(refs))
+        res = self.api.get_from_ws_many(
+            [frontier[ref][0] for ref in refs], batch_size=self.batch_size, raw=True
+        )
+        for ref, ws_data in zip(refs, res):
+            if isinstance(ws_data, WorkspaceObjectError):
+                self.objects[ref] = ws_data
+                self._children[ref] = []
+            else:
+                # builders may modify the data, walk it first
+                self._children[ref] = find_refs(ws_data["data"], self.fields)
+                self.objects[ref] = _build_object(self._factory, ref, ws_data)
+
+    def resolve(self, roots, max_depth=None):
+        """
+        Fetch the dependency closure of roots.
+
+        :param roots: list of references (fetched as depth 0), objects already fetched or
+            object data dicts
+        :param max_depth: levels of references to follow (default self.max_depth)
+        :return: dict of reference -> object (WorkspaceObjectError if not accessible) of every
+            fetched root and dependency
+        """
+        if max_depth is None:
+            max_depth = self.max_depth
+        closure = {}
+        # reference -> (reference path, depth)
+        frontier = {}
+        for root in roots:
+            path, data = self._root_refs(root)
+            if data is None:
+                frontier.setdefault(path, (path, 0))
+            elif max_depth > 0:
+                for child in find_refs(data, self.fields):
+                    child_path = f"{path};{child}" if path else child
+                    frontier.setdefault(child, (child_path, 1))
+
+        while frontier:
+            self._fetch(frontier)
+            next_frontier = {}
+            for ref, (path, depth) in frontier.items():
+                closure[ref] = self.objects[ref]
+                if depth >= max_depth:
+                    continue
+                for child in self._children[ref]:
+                    if child not in closure and child not in frontier:
+                        next_frontier.setdefault(child, (f"{path};{child}", depth + 1))
+            frontier = next_frontier
+        return closure
@@ -16,3 +16,25 @@ class ShockException(Exception):
     """
 
     pass
+
+
+class WorkspaceObjectError(Exception):
+    """
+    Error fetching a single object from the workspace as part of a bulk call
+    """
+
+    def __init__(self, ref, message):
+        super().__init__(f"{ref}: {message}")
+        self.ref = ref
+        self.message = message
+
+
+class CacheIntegrityError(Exception):
+    """
+    Corrupt cache entry (unreadable or not matching its stored digest)
+    """
+
+    def __init__(self, ref, message):
+        super().__init__(f"{ref}: {message}")
+        self.ref = ref
+        self.message = message
@@ -1,12 +1,27 @@
+import os
+import json
+import time
+import bisect
+import logging
 from cobrakbase.kbase_object_info import KBaseObjectInfo
+from cobrakbase.cache_store import write_atomic
 
-PROD_WS_MEDIA = 'KBaseMedia'
-PROD_WS_GENOMES = '?'
-PROD_WS_TEMPLATES = 'NewKBaseModelTemplates'
+logger = logging.getLogger(__name__)
 
+PROD_WS_MEDIA = "KBaseMedia"
+PROD_WS_GENOMES = "?"
+PROD_WS_TEMPLATES = "NewKBaseModelTemplates"
+DEFAULT_SNAPSHOT_PATH = "~/.kbase/catalog"
+
+
+def _info_to_list(info):
+    data = list(info.to_kbase_json())
+    if info.type_version:
+        data[2] = f"{info.type}-{info.type_version}"
+    return data
 
-class KBaseCatalogItem:
 
+class KBaseCatalogItem:
     def __init__(self, api, info):
         self.api = api
         self.info = info
@@ -19,26 +34,164 @@ class KBaseCatalogItem:
 
 
 class KBaseCatalog:
+    """
+    Objects of a workspace (e.g., KBaseMedia) accessible as attributes, catalog.Carbon_D_Glucose,
+    or items, catalog["Carbon-D-Glucose"] (fetches the object).
+
+    Like namedtuple, catalog methods and attributes start with an underscore (_find, _refresh,
+    _get_many, _items) so that they never shadow workspace objects.
 
-    def __init__(self, api, ws):
+    The listing is loaded on first access and can be persisted to a local snapshot shared by
+    processes. A snapshot is reused while the workspace modification date and max object id
+    are unchanged, checking them costs one get_workspace_info call instead of a full listing.
+    """
+
+    def __init__(
+        self, api, ws, snapshot_path=None, snapshot_ttl=0, lazy=True, page_size=None
+    ):
+        """
+
+        :param api: KBaseAPI
+        :param ws: workspace id or name
+        :param snapshot_path: folder of listing snapshots (None disables snapshots), use
+            DEFAULT_SNAPSHOT_PATH to share them between processes
+        :param snapshot_ttl: seconds a snapshot is trusted without checking the workspace
+        :param lazy: list the workspace on first access instead of now
+        :param page_size: list_objects page size (default KBaseAPI.iter_objects default)
+        """
         self._ws = ws
         self._api = api
-        self._items = {}
-        self._update_catalog()
+        self._listing = None
+        self._by_type = None
+        self._names = None
+        self._snapshot_path = snapshot_path and os.path.expanduser(snapshot_path)
+        self._snapshot_ttl = snapshot_ttl
+        self._page_size = page_size
+        if not lazy:
+            self._update_catalog()
+
+    @property
+    def _items(self):
+        """
+        :return: dict of attribute name -> KBaseCatalogItem
+        """
+        if self._listing is None:
+            self._update_catalog()
+        return self._listing
+
+    def _snapshot_file(self):
+        return os.path.join(self._snapshot_path, f"{self._ws}.json")
+
+    def _read_snapshot(self):
+        if self._snapshot_path is None:
+            return None
+        try:
+            with open(self._snapshot_file(), "r") as fh:
+                snapshot = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - snapshot["created"] < self._snapshot_ttl:
+            return snapshot["infos"]
+        ws_info = self._api.get_workspace_info(self._ws)
+        # moddate and max object id change when objects are saved, copied or deleted
+        if ws_info[3:5] != snapshot["workspace_info"][3:5]:
+            logger.debug("[%s] snapshot is stale", self._ws)
+            return None
+        self._write_snapshot(ws_info, snapshot["infos"])
+        return snapshot["infos"]
 
-    def _update_catalog(self):
-        res = self._api.list_objects(self._ws)
-        for o in res:
+    def _write_snapshot(self, ws_info, infos):
+        os.makedirs(self._snapshot_path, exist_ok=True)
+        snapshot = {"created": time.time(), "workspace_info": ws_info, "infos": infos}
+        write_atomic(self._snapshot_file(), json.dumps(snapshot).encode("utf-8"))
+
+    def _list_objects(self):
+        kwargs = {"page_size": self._page_size} if self._page_size else {}
+        return [_info_to_list(o) for o in self._api.iter_objects(self._ws, **kwargs)]
+
+    def _update_catalog(self, force=False):
+        infos = None if force else self._read_snapshot()
+        if infos is None:
+            ws_info = None
+            if self._snapshot_path is not None:
+                # read before listing, changes made while listing leave the snapshot stale
+                ws_info = self._api.get_workspace_info(self._ws)
+            infos = self._list_objects()
+            if ws_info is not None:
+                self._write_snapshot(ws_info, infos)
+
+        items = {}
+        by_type = {}
+        for o in infos:
             info = KBaseObjectInfo.from_kbase_json(o)
-            # print(str(info), info.id)
-            opt = info.id.replace('-', '_')
+            opt = info.id.replace("-", "_")
             item = KBaseCatalogItem(self._api, info)
-            self._items[opt] = item
-            self.__dict__[opt] = item
+            items[opt] = item
+            by_type.setdefault(info.type, []).append(item)
+        self._listing = items
+        self._by_type = by_type
+        self._names = sorted((item.info.id, opt) for opt, item in items.items())
+
+    def _refresh(self):
+        """
+        List the workspace again (and update the snapshot).
+        """
+        self._update_catalog(force=True)
+
+    def _find(self, object_type=None, name_prefix=None):
+        """
+        Search the catalog listing.
+
+        :param object_type: object type without version (e.g., KBaseBiochem.Media)
+        :param name_prefix: object name prefix
+        :return: list of KBaseCatalogItem
+        """
+        items = self._items
+        if name_prefix:
+            start = bisect.bisect_left(self._names, (name_prefix,))
+            found = []
+            for name, opt in self._names[start:]:
+                if not name.startswith(name_prefix):
+                    break
+                found.append(items[opt])
+        elif object_type:
+            found = self._by_type.get(object_type, [])
+        else:
+            found = list(items.values())
+        if object_type:
+            found = [item for item in found if item.info.type == object_type]
+        return found
+
+    def _get_many(self, keys, **kwargs):
+        """
+        Fetch many catalog objects in batched get_objects2 calls (KBaseAPI.get_from_ws_many).
+
+        :param keys: list of object names or KBaseCatalogItem
+        :param kwargs: get_from_ws_many arguments (batch_size, max_bytes)
+        :return: list of objects in the same order, objects that failed to fetch are returned
+            as WorkspaceObjectError
+        """
+        refs = []
+        for key in keys:
+            if not isinstance(key, KBaseCatalogItem):
+                key = self._items[key.replace("-", "_")]
+            refs.append(str(key.info))
+        return self._api.get_from_ws_many(refs, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        items = self._items
+        if name in items:
+            return items[name]
+        raise AttributeError(f"{name} not found in catalog {self._ws}")
+
+    def __dir__(self):
+        return list(super().__dir__()) + list(self._items)
 
     def __getitem__(self, key: str):
-        key = key.replace('-', '_')
-        return self.__dict__[key].get()
+        key = key.replace("-", "_")
+        return self._items[key].get()
 
     def __len__(self):
         return len(self._items)
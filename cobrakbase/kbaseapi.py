@@ -1,18 +1,27 @@
 import sys
-import time
+import hashlib
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import cobra
 import os
-import requests
 import json
 from pathlib import Path
 from cobrakbase.Workspace.WorkspaceClient import Workspace as WorkspaceClient
 from cobrakbase.AbstractHandleClient import AbstractHandle as HandleService
 from cobrakbase.kbase_object_info import KBaseObjectInfo
 from cobrakbase.core.kbase_object_factory import KBaseObjectFactory
-from cobrakbase.Workspace.baseclient import ServerError
+from cobrakbase.Workspace.baseclient import (
+    ServerError,
+    create_session,
+    DEFAULT_POOL_SIZE,
+    _JSONObjectEncoder,
+)
+from cobrakbase.Workspace.retry import RetryPolicy, CircuitBreaker
 from cobrakbase.core.kbaseobject import KBaseObject
-from cobrakbase.exceptions import ShockException
+from cobrakbase.exceptions import ShockException, WorkspaceObjectError
+from cobrakbase.shock import ShockClient
 
 logger = logging.getLogger(__name__)
 
@@ -21,37 +30,243 @@ KBASE_HANDLE_URL = "https://kbase.us/services/handle_service"
 KBASE_SHOCK_URL = "https://kbase.us/services/shock-api"
 DEV_KBASE_WS_URL = "https://appdev.kbase.us/services/ws/"
 
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BATCH_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_SAVE_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_PAGE_SIZE = 5000
+# list_objects returns at most this many objects whatever the limit
+MAX_PAGE_SIZE = 10000
+
+_GENOME_FIELDS = [
+    "id",
+    "scientific_name",
+    "domain",
+    "genome_tiers",
+    "feature_counts",
+    "genetic_code",
+    "dna_size",
+    "num_contigs",
+    "molecule_type",
+    "source",
+    "md5",
+    "gc_content",
+    "taxonomy",
+    "assembly_ref",
+    "taxon_ref",
+    "ontology_events",
+]
+_MODEL_REACTION_FIELDS = [
+    "id",
+    "name",
+    "pathway",
+    "reaction_ref",
+    "direction",
+    "maxforflux",
+    "maxrevflux",
+    "protons",
+    "probability",
+    "modelcompartment_ref",
+    "modelReactionReagents",
+    "modelReactionProteins",
+    "dblinks",
+    "aliases",
+    "reference",
+    "imported_gpr",
+    "string_attributes",
+    "numerical_attributes",
+]
+
+# named sets of included paths (see get_from_ws)
+PROJECTIONS = {
+    # feature ids, functions and ontology terms without DNA/protein sequences or CDSs
+    "genome-functions-only": _GENOME_FIELDS
+    + [
+        "features/[*]/id",
+        "features/[*]/function",
+        "features/[*]/functions",
+        "features/[*]/ontology_terms",
+    ],
+    # model without the per reaction gapfill_data and gapfilling candidates
+    "model-without-gapfill-data": [
+        "id",
+        "name",
+        "source",
+        "source_id",
+        "type",
+        "genome_ref",
+        "metagenome_ref",
+        "template_ref",
+        "template_refs",
+        "core_template_ref",
+        "attributes",
+        "drain_list",
+        "gapfillings",
+        "gapgens",
+        "biomasses",
+        "modelcompartments",
+        "modelcompounds",
+    ]
+    + [f"modelreactions/[*]/{field}" for field in _MODEL_REACTION_FIELDS],
+}
+
+
+def get_included_paths(included=None, projection=None):
+    """
+    Merge explicit included paths with the paths of a named projection.
+
+    :param included: list of object paths (e.g., features/[*]/id)
+    :param projection: name of a projection in PROJECTIONS
+    :return: list of paths or None to fetch the full object
+    """
+    if projection is None:
+        return included
+    if projection not in PROJECTIONS:
+        raise ValueError(
+            f"unknown projection [{projection}] expected one of {list(PROJECTIONS)}"
+        )
+    return list(PROJECTIONS[projection]) + [
+        path for path in included or [] if path not in PROJECTIONS[projection]
+    ]
+
+
+def _get_token(token=None, public=False):
+    if public:
+        return None
+    if token is None and Path(str(Path.home()) + "/.kbase/token").exists():
+        with open(str(Path.home()) + "/.kbase/token", "r") as fh:
+            token = fh.read().strip()
+    if token is None:
+        raise Exception("missing token value or ~/.kbase/token file")
+    return token
+
+
+def _json_size(data):
+    try:
+        import orjson
+
+        return len(orjson.dumps(data))
+    except (ImportError, TypeError):
+        # orjson missing or unable to encode (sets, non str keys)
+        return len(json.dumps(data, cls=_JSONObjectEncoder))
+
+
+def _build_object(factory, ref, ws_data):
+    """
+    :return: object built from a get_objects2 data element, or WorkspaceObjectError if its
+        builder fails (e.g., a genome missing required fields)
+    """
+    try:
+        return factory.create({"data": [ws_data]}, None)
+    except Exception as e:
+        logger.warning("unable to build object %s: %s", ref, e)
+        return WorkspaceObjectError(ref, str(e))
+
+
+def json_digest(data):
+    """
+    md5 of the canonical JSON (sorted keys, compact, UTF-8) of data, the form the workspace
+    checksums objects with.
+    """
+    content = json.dumps(
+        data,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        cls=_JSONObjectEncoder,
+    )
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
 
 # Why not put this in the constructor?
-def _get_ws_client(token, dev=False):
+def _get_ws_client(token, dev=False, session=None, retry_policy=None, hooks=None):
     url = KBASE_WS_URL
     if dev:
         url = DEV_KBASE_WS_URL
-    return WorkspaceClient(url, token=token)
+    return WorkspaceClient(
+        url, token=token, session=session, retry_policy=retry_policy, hooks=hooks
+    )
 
 
 class KBaseAPI:
-    
-    def __init__(self, token=None, dev=False, config=None, public=False):
+    def __init__(
+        self,
+        token=None,
+        dev=False,
+        config=None,
+        public=False,
+        pool_size=DEFAULT_POOL_SIZE,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        retry_policy=None,
+        session=None,
+        hooks=None,
+    ):
+        """
+
+        :param token: KBase token (default ~/.kbase/token)
+        :param dev: use the appdev services
+        :param config: dict of service urls (workspace-url, handle-url, shock-url)
+        :param public: anonymous access
+        :param pool_size: keep-alive connections of the shared session
+        :param max_in_flight: maximum concurrent get_objects2 calls of parallel fetches
+        :param retry_policy: RetryPolicy of every call (default 3 attempts with a circuit
+            breaker)
+        :param session: requests.Session or transport (see Workspace.transport) used for all
+            calls, e.g., ReplayTransport to run without network
+        :param hooks: callables receiving a CallRecord after each workspace, handle and shock
+            call (e.g., Workspace.instrumentation.CallStatsAggregator)
+        """
         self.max_retry = 3
-        self._token = token
-        if not public:
-            if (
-                self._token is None
-                and Path(str(Path.home()) + "/.kbase/token").exists()
-            ):
-                with open(str(Path.home()) + "/.kbase/token", "r") as fh:
-                    self._token = fh.read().strip()
-            if self._token is None:
-                raise Exception("missing token value or ~/.kbase/token file")
-        else:
-            self._token = None
+        # shared by all clients so the circuit breaker sees every call
+        self.retry_policy = retry_policy
+        if self.retry_policy is None:
+            self.retry_policy = RetryPolicy(
+                max_attempts=self.max_retry, circuit_breaker=CircuitBreaker()
+            )
+        self._token = _get_token(token, public)
 
+        # one keep-alive connection pool shared by workspace, handle and shock calls
+        self.session = session if session is not None else create_session(pool_size)
+        self.hooks = list(hooks or [])
         if config is None:
-            self.ws_client = _get_ws_client(self._token, dev)
-            self.hs = HandleService(KBASE_HANDLE_URL, token=self._token)
+            self.ws_client = _get_ws_client(
+                self._token, dev, self.session, self.retry_policy, self.hooks
+            )
+            self.hs = HandleService(
+                KBASE_HANDLE_URL,
+                token=self._token,
+                session=self.session,
+                retry_policy=self.retry_policy,
+                hooks=self.hooks,
+            )
         else:
-            self.ws_client = WorkspaceClient(config["workspace-url"], token=self._token)
+            self.ws_client = WorkspaceClient(
+                config["workspace-url"],
+                token=self._token,
+                session=self.session,
+                retry_policy=self.retry_policy,
+                hooks=self.hooks,
+            )
+            if "handle-url" in config:
+                self.hs = HandleService(
+                    config["handle-url"],
+                    token=self._token,
+                    session=self.session,
+                    retry_policy=self.retry_policy,
+                    hooks=self.hooks,
+                )
+        shock_url = (
+            config.get("shock-url", KBASE_SHOCK_URL) if config else KBASE_SHOCK_URL
+        )
+        self.shock = ShockClient(shock_url, self._token, self.session, hooks=self.hooks)
+        # limits concurrent get_objects2 requests across all parallel fetches
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._local = threading.local()
+        # versioned reference (ws/obj/ver) -> KBaseObjectInfo, versions are immutable
+        self._info_cache = {}
+        # versioned reference -> json_digest of the data saved by this instance
+        self._saved_digests = {}
 
     # def _find_token(self):
 
@@ -93,45 +308,29 @@ class KBaseAPI:
         pass
 
     def download_file_from_kbase2(self, handle_ref, file_name):
-        headers = {"Authorization": "OAuth " + self._token}
-
-        handles = self.hs.hids_to_handles([handle_ref])
-        file_id = handles[0]["id"]
-        node_url = KBASE_SHOCK_URL + "/node/" + file_id
-
-        written_bytes = 0
-
-        with open(file_name, "wb") as fh:
-            with requests.get(
-                node_url + "?download_raw",
-                stream=True,
-                headers=headers,
-                allow_redirects=True,
-            ) as r:
-                if not r.ok:
-                    err_txt = "Error downloading file from shock node {}: ".format(
-                        file_id
-                    )
-                    raise ShockException(err_txt)
-                for chunk in r.iter_content(1024):
-                    if not chunk:
-                        break
-                    written_bytes += fh.write(chunk)
-        return written_bytes
+        handle = self.hs.hids_to_handles([handle_ref])[0]
+        self.shock.download(
+            handle["id"], file_name, md5=handle.get("remote_md5") or None
+        )
+        return os.path.getsize(file_name)
 
     def download_file_from_kbase(self, file_id, file_path, is_handle_ref=1):
         """
-        FIXME: THIS SEEMS TO DOWNLOAD THE FILE TWICE !
-        :param file_id:
-        :param file_path:
-        :param is_handle_ref:
-        :return:
-        """
-        headers = {"Authorization": "OAuth " + self._token}
+        Download a handle (or Shock node) to a file or directory. Handle metadata provides
+        the file name and md5 so no extra node request is needed, partial downloads are resumed.
 
+        :param file_id: handle id or shock node id
+        :param file_path: directory (created if missing) or file path
+        :param is_handle_ref: file_id is a handle id
+        :return: path of the downloaded file
+        """
+        file_name = None
+        md5 = None
         if is_handle_ref == 1:
-            handles = self.hs.hids_to_handles([file_id])
-            file_id = handles[0]["id"]
+            handle = self.hs.hids_to_handles([file_id])[0]
+            file_id = handle["id"]
+            file_name = handle.get("file_name")
+            md5 = handle.get("remote_md5") or None
 
         if not os.path.exists(file_path):
             try:
@@ -142,71 +341,125 @@ class KBaseAPI:
         elif not os.path.isdir(file_path):
             raise ShockException("file_path: %s must be directory", file_path)
 
-        node_url = KBASE_SHOCK_URL + "/node/" + file_id
-        r = requests.get(node_url, headers=headers, allow_redirects=True)
+        return self.shock.download(file_id, file_path, file_name, md5)
 
-        if not r.ok:
-            err_txt = "Error downloading file from shock node {}: ".format(file_id)
-            raise ShockException(err_txt)
-
-        resp_obj = r.json()
-        size = resp_obj["data"]["file"]["size"]
-        if not size:
-            raise ShockException("Node {} has no file".format(file_id))
-
-        node_file_name = resp_obj["data"]["file"]["name"]
-        attributes = resp_obj["data"]["attributes"]
-        if os.path.isdir(file_path):
-            file_path = os.path.join(file_path, node_file_name)
-        with open(file_path, "wb") as fh:
-            with requests.get(
-                node_url + "?download_raw",
-                stream=True,
-                headers=headers,
-                allow_redirects=True,
-            ) as r:
-                if not r.ok:
-                    err_txt = "Error downloading file from shock node {}: ".format(
-                        file_id
-                    )
-                    raise ShockException(err_txt)
-                for chunk in r.iter_content(1024):
-                    if not chunk:
-                        break
-                    fh.write(chunk)
-        return file_path
-
-    def get_objects2(self, args):
-        """
-            All functions calling get_objects2 should call this function to ensure they get the retry
-        code because workspace periodically times out
+    def download_files_from_kbase(
+        self, handle_ids, file_path, workers=4, max_bytes_per_second=None
+    ):
+        """
+        Download many handles into a directory, handles are resolved with a single
+        hids_to_handles call and files are downloaded concurrently.
+
+        :param handle_ids: list of handle ids
+        :param file_path: directory (created if missing)
+        :param workers: maximum concurrent downloads
+        :param max_bytes_per_second: total bandwidth cap (default unlimited)
+        :return: list of file paths in the same order as handle_ids, failed downloads
+            and unknown handles are returned as ShockException
+        """
+        os.makedirs(file_path, exist_ok=True)
+        hids = list(dict.fromkeys(handle_ids))
+        # handles are matched by hid, the service may omit or reorder them
+        handles = {h["hid"]: h for h in self.hs.hids_to_handles(hids)}
+        downloads = []
+        file_names = set()
+        for hid in hids:
+            if hid not in handles:
+                continue
+            handle = handles[hid]
+            file_name = handle.get("file_name") or handle["id"]
+            # concurrent downloads to the same .part file would corrupt each other
+            base, ext = os.path.splitext(file_name)
+            n = 1
+            while file_name in file_names:
+                file_name = f"{base}_{n}{ext}"
+                n += 1
+            file_names.add(file_name)
+            downloads.append(
+                {
+                    "node_id": handle["id"],
+                    "file_path": file_path,
+                    "file_name": file_name,
+                    "md5": handle.get("remote_md5") or None,
+                }
+            )
+        res = self.shock.download_many(downloads, workers, max_bytes_per_second)
+        paths = dict(zip([hid for hid in hids if hid in handles], res))
+        return [
+            paths[hid] if hid in paths else ShockException(f"handle {hid} not found")
+            for hid in handle_ids
+        ]
+
+    def _persist_handle(self, node):
+        handle = {
+            "id": node["id"],
+            "type": "shock",
+            "url": self.shock.url,
+            "file_name": node["file_name"],
+            "remote_md5": node["md5"],
+        }
+        handle["hid"] = self.hs.persist_handle(handle)
+        return handle
+
+    def upload_file_to_kbase(self, file_path, file_name=None, make_handle=True):
+        """
+        Upload a file to Shock streaming it in chunks (see ShockClient.upload), interrupted
+        uploads are resumed.
+
+        :param file_path: file to upload
+        :param file_name: node file name (default the file base name)
+        :param make_handle: register a handle for the node
+        :return: handle (with hid) or node data if make_handle is False
+        """
+        node = self.shock.upload(file_path, file_name)
+        return self._persist_handle(node) if make_handle else node
+
+    def upload_files_to_kbase(
+        self, file_paths, workers=4, max_bytes_per_second=None, make_handle=True
+    ):
+        """
+        Upload many files concurrently, each handle is registered as soon as its upload
+        completes so handle calls overlap with the remaining uploads.
+
+        :param file_paths: list of files
+        :param workers: maximum concurrent uploads
+        :param max_bytes_per_second: total bandwidth cap (default unlimited)
+        :param make_handle: register a handle for each node
+        :return: list of handles (node data if make_handle is False) in the same order,
+            failed uploads are returned as ShockException
+        """
+        uploads = [{"file_path": file_path} for file_path in file_paths]
+        return self.shock.upload_many(
+            uploads,
+            workers,
+            max_bytes_per_second,
+            callback=self._persist_handle if make_handle else None,
+        )
+
+    def get_objects2(self, args, ws_client=None, stream=False):
+        """
+        All functions calling get_objects2 should call this function, missing or inaccessible
+        objects return None. Transient failures are retried by the client retry policy.
 
         :param args:
+        :param ws_client: workspace client to use (default self.ws_client)
+        :param stream: parse the response incrementally (requires ijson)
         :return:
         """
-        tries = 0
-        while tries < self.max_retry:
-            try:
-                return self.ws_client.get_objects2(args)
-            except ServerError as e:
-                if e.code == -32400:
-                    logger.error(e.message)
-                    return None
-                if e.code == -32500:
-                    logger.warning(e.message)
-                    return None
-                logger.warning(
-                    "Workspace get_objects2 call failed [%s:%s - %s]. Trying again!",
-                    e.name,
-                    e.code,
-                    e.message,
-                )
-                tries += 1
-                time.sleep(500)  # Give half second
-        logger.warning(
-            "get_objects2 failed after multiple tries: %s", sys.exc_info()[0]
-        )
-        raise
+        if ws_client is None:
+            ws_client = self.ws_client
+        try:
+            if stream:
+                return {"data": list(ws_client.get_objects2_stream(args))}
+            return ws_client.get_objects2(args)
+        except ServerError as e:
+            if e.code == -32400:
+                logger.error(e.message)
+                return None
+            if e.code == -32500:
+                logger.warning(e.message)
+                return None
+            raise
 
     def get_object(self, object_id, ws=None):
         res = self.get_objects2(
@@ -216,14 +469,241 @@ class KBaseAPI:
             return None
         return res["data"][0]["data"]
 
-    def get_from_ws(self, id_or_ref, workspace=None):
-        res = self.get_objects2(
-            {"objects": [self.process_workspace_identifiers(id_or_ref, workspace)]}
-        )
+    def get_from_ws(
+        self, id_or_ref, workspace=None, included=None, projection=None, stream=False
+    ):
+        """
+        Fetch and build an object. With included paths or a projection only that subset of
+        the object data is transferred, builders that require missing fields fall back to
+        KBaseObject.
+
+        :param id_or_ref:
+        :param workspace:
+        :param included: list of object paths to fetch (e.g., ["id", "features/[*]/id"])
+        :param projection: named projection from PROJECTIONS (e.g., genome-functions-only)
+        :param stream: parse the response incrementally (requires ijson), avoids holding the
+            raw response text in memory together with the parsed object
+        :return:
+        """
+        spec = self.process_workspace_identifiers(id_or_ref, workspace)
+        included = get_included_paths(included, projection)
+        if included:
+            spec["included"] = included
+        res = self.get_objects2({"objects": [spec]}, stream=stream)
         if res is None:
             return None
         factory = KBaseObjectFactory()
-        return factory.create(res, None)
+        return factory.create(res, None, partial=bool(included))
+
+    def get_from_ws_many(
+        self,
+        refs,
+        workspace=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_bytes=DEFAULT_BATCH_MAX_BYTES,
+        stream=False,
+        raw=False,
+    ):
+        """
+        Fetch many objects packing their specifications into as few get_objects2 calls as possible.
+        Batches are split by object count and by the object sizes reported by get_object_info3,
+        an object larger than max_bytes is fetched alone.
+
+        :param refs: list of object references (or ids/names if workspace is given)
+        :param workspace: workspace id or name used to resolve non-reference ids
+        :param batch_size: maximum number of objects per call
+        :param max_bytes: maximum sum of object sizes (bytes) per get_objects2 call
+        :param stream: parse responses incrementally building each object as soon as its
+            data is parsed (requires ijson)
+        :param raw: return the get_objects2 data elements (data, info, refs, ...) instead of
+            building objects
+        :return: list of objects in the same order as refs, objects that failed to fetch
+            are returned as WorkspaceObjectError
+        """
+        specs = [self.process_workspace_identifiers(ref, workspace) for ref in refs]
+        results = [None] * len(refs)
+        sizes = {}
+        infos = self.get_object_infos(refs, workspace, batch_size)
+        for i, info in enumerate(infos):
+            if isinstance(info, WorkspaceObjectError):
+                results[i] = info
+            else:
+                sizes[i] = info.size or 0
+
+        factory = KBaseObjectFactory()
+        for batch in self._pack_batches(sizes, batch_size, max_bytes):
+            params = {"objects": [specs[i] for i in batch], "ignoreErrors": 1}
+            try:
+                if stream:
+                    data = self.ws_client.get_objects2_stream(params)
+                else:
+                    data = self.ws_client.get_objects2(params)["data"]
+                for i, ws_data in zip(batch, data):
+                    if ws_data is None:
+                        results[i] = WorkspaceObjectError(
+                            refs[i], "object not accessible"
+                        )
+                    elif raw:
+                        results[i] = ws_data
+                    else:
+                        results[i] = _build_object(factory, refs[i], ws_data)
+            except Exception as e:
+                # e.g. ConnectionError or CircuitOpenError, keep the other batches
+                message = e.message if isinstance(e, ServerError) else str(e)
+                logger.warning(message)
+                for i in batch:
+                    if results[i] is None:
+                        results[i] = WorkspaceObjectError(refs[i], message)
+        return results
+
+    def iter_from_ws(self, refs, workspace=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Stream objects: each get_objects2 response (batch_size objects) is parsed incrementally
+        (requires ijson) and every object is built and yielded as soon as its data is parsed,
+        memory use is proportional to one object instead of the whole batch.
+
+        :param refs: list of object references (or ids/names if workspace is given)
+        :param workspace: workspace id or name used to resolve non-reference ids
+        :param batch_size: maximum number of objects per call
+        :return: generator of (ref, object), objects that failed to fetch are returned as
+            WorkspaceObjectError
+        """
+        factory = KBaseObjectFactory()
+        for start in range(0, len(refs), batch_size):
+            batch = refs[start : start + batch_size]
+            params = {
+                "objects": [
+                    self.process_workspace_identifiers(ref, workspace) for ref in batch
+                ],
+                "ignoreErrors": 1,
+            }
+            done = 0
+            try:
+                for ws_data in self.ws_client.get_objects2_stream(params):
+                    ref = batch[done]
+                    done += 1
+                    if ws_data is None:
+                        yield ref, WorkspaceObjectError(ref, "object not accessible")
+                    else:
+                        yield ref, _build_object(factory, ref, ws_data)
+            except Exception as e:
+                message = e.message if isinstance(e, ServerError) else str(e)
+                logger.warning(message)
+                for ref in batch[done:]:
+                    yield ref, WorkspaceObjectError(ref, message)
+
+    def _get_thread_ws_client(self):
+        """
+        Workspace client owned by the calling thread, worker threads keep their client between
+        calls and share the connection pool of self.session.
+        """
+        ws_client = getattr(self._local, "ws_client", None)
+        if ws_client is None:
+            ws_client = WorkspaceClient(
+                self.ws_client._client.url,
+                token=self._token,
+                session=self.session,
+                retry_policy=self.retry_policy,
+                hooks=self.hooks,
+            )
+            self._local.ws_client = ws_client
+        return ws_client
+
+    def _fetch_one(self, id_or_ref, workspace=None):
+        spec = self.process_workspace_identifiers(id_or_ref, workspace)
+        try:
+            with self._in_flight:
+                res = self.get_objects2(
+                    {"objects": [spec]}, self._get_thread_ws_client()
+                )
+        except Exception as e:
+            # e.g. ConnectionError or CircuitOpenError, keep the other fetches
+            message = e.message if isinstance(e, ServerError) else str(e)
+            logger.warning("fetch of %s failed: %s", id_or_ref, message)
+            return WorkspaceObjectError(id_or_ref, message)
+        if res is None:
+            return WorkspaceObjectError(id_or_ref, "get_objects2 failed")
+        # the in-flight limit covers the request and its JSON decoding (done in _post),
+        # only object construction runs outside it
+        return _build_object(KBaseObjectFactory(), id_or_ref, res["data"][0])
+
+    def _iter_parallel(self, refs, workspace, workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            refs = enumerate(refs)
+
+            def submit_next():
+                for i, ref in refs:
+                    future = executor.submit(self._fetch_one, ref, workspace)
+                    pending[future] = (i, ref)
+                    return
+
+            # keep a bounded window of submitted fetches so results do not pile up
+            for _ in range(workers * 2):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, ref = pending.pop(future)
+                    submit_next()
+                    yield i, ref, future.result()
+
+    def iter_parallel(self, refs, workspace=None, workers=DEFAULT_WORKERS):
+        """
+        Fetch objects concurrently yielding them as soon as each one is built.
+
+        :param refs: iterable of object references (or ids/names if workspace is given)
+        :param workspace: workspace id or name used to resolve non-reference ids
+        :param workers: number of worker threads
+        :return: generator of (ref, object) pairs in completion order, objects that
+            failed to fetch are WorkspaceObjectError
+        """
+        for _, ref, o in self._iter_parallel(refs, workspace, workers):
+            yield ref, o
+
+    def fetch_parallel(self, refs, workspace=None, workers=DEFAULT_WORKERS):
+        """
+        Fetch objects concurrently with a pool of worker threads. Network calls and JSON
+        decoding are bounded by the max_in_flight limit of this API instance, object
+        construction runs in the workers overlapping with other requests.
+
+        :param refs: list of object references (or ids/names if workspace is given)
+        :param workspace: workspace id or name used to resolve non-reference ids
+        :param workers: number of worker threads
+        :return: list of objects in the same order as refs, objects that failed to fetch
+            are returned as WorkspaceObjectError
+        """
+        results = [None] * len(refs)
+        for i, _, o in self._iter_parallel(refs, workspace, workers):
+            results[i] = o
+        return results
+
+    @staticmethod
+    def _pack_batches(sizes, batch_size, max_bytes):
+        """
+        Group object indexes (keeping their order) into batches of at most batch_size
+        objects and max_bytes total size.
+
+        :param sizes: dict of index -> object size in bytes
+        :param batch_size:
+        :param max_bytes:
+        :return: list of lists of indexes
+        """
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for i in sorted(sizes):
+            if batch and (
+                len(batch) >= batch_size or batch_bytes + sizes[i] > max_bytes
+            ):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(i)
+            batch_bytes += sizes[i]
+        if batch:
+            batches.append(batch)
+        return batches
 
     def save(self, data, object_id, ws=None, object_type=None, meta=None):
         # get type from info if present
@@ -231,7 +711,13 @@ class KBaseAPI:
             pass
         self.save_object(object_id, ws, object_type, data, meta)
 
-    def save_object(self, object_id, ws, object_type, data, meta=None):
+    @staticmethod
+    def _serialize_object(object_id, data, meta=None):
+        """
+        Convert an object to the workspace data dict.
+
+        :return: tuple (data, meta)
+        """
         if not meta:
             if "get_metadata" in dir(data):
                 meta = data.get_metadata()
@@ -247,26 +733,78 @@ class KBaseAPI:
             from cobrakbase.core.kbasefba.fbamodel_from_cobra import CobraModelConverter
 
             fbamodel = CobraModelConverter(data, None, None).build()
-            json = fbamodel.get_data()
-            json["id"] = object_id  # rename object id to the saved object_id
+            model_data = fbamodel.get_data()
+            model_data["id"] = object_id  # rename object id to the saved object_id
             # TODO use fbamodel in the future after fixing FBAModel serializer
-            to_save = json
+            to_save = model_data
+        return to_save, meta
+
+    @staticmethod
+    def _build_provenance(method, method_params):
         from cobrakbase import __version__
 
-        provenance = [
+        return [
             {
                 "description": "ModelSEEDpy-KBase",
                 "input_ws_objects": [],
-                "method": "save_object",
+                "method": method,
                 "script_command_line": f"{sys.version}",
-                "method_params": [
-                    {"object_id": object_id, "ws": ws, "object_type": object_type}
-                ],
+                "method_params": method_params,
                 "service": "cobrakbase.KBaseAPI",
                 "service_ver": __version__,
                 # 'time': '2015-12-15T22:58:55+0000'
             }
         ]
+
+    def _find_unchanged(self, object_id, ws, object_type, to_save, meta):
+        """
+        :return: tuple (latest KBaseObjectInfo if it has the same type, data and the
+            given metadata else None, digest of to_save)
+        """
+        digest = json_digest(to_save)
+        info = self.get_object_infos([object_id], ws)[0]
+        if isinstance(info, WorkspaceObjectError):
+            return None, digest
+        if object_type and info.type != object_type.split("-")[0]:
+            return None, digest
+        # the workspace adds metadata from the type spec, only compare the given keys
+        stored_meta = info.metadata or {}
+        if any(stored_meta.get(k) != v for k, v in (meta or {}).items()):
+            return None, digest
+        # the server may format numbers differently, also trust digests of our own saves
+        if digest in (info.checksum, self._saved_digests.get(info.reference)):
+            return info, digest
+        return None, digest
+
+    def save_object(
+        self, object_id, ws, object_type, data, meta=None, skip_if_unchanged=False
+    ):
+        """
+        Save an object to a workspace.
+
+        :param object_id: object name
+        :param ws: workspace id or name
+        :param object_type: object type (e.g., KBaseFBA.FBAModel)
+        :param data: object data dict or object with get_data
+        :param meta: object metadata (default the object get_metadata)
+        :param skip_if_unchanged: compare the data digest with the latest version checksum
+            (one get_object_info3 call) and return the latest info instead of saving an
+            identical new version
+        :return: KBaseObjectInfo
+        """
+        to_save, meta = self._serialize_object(object_id, data, meta)
+        digest = None
+        if skip_if_unchanged:
+            info, digest = self._find_unchanged(
+                object_id, ws, object_type, to_save, meta
+            )
+            if info is not None:
+                logger.debug("[%s] unchanged, skipping save of %s", object_id, info)
+                return info
+        provenance = self._build_provenance(
+            "save_object",
+            [{"object_id": object_id, "ws": ws, "object_type": object_type}],
+        )
         params = {
             "objects": [
                 {
@@ -282,7 +820,101 @@ class KBaseAPI:
             params["id"] = ws
         else:
             params["workspace"] = ws
-        return KBaseObjectInfo(self.ws_client.save_objects(params)[0])
+        info = KBaseObjectInfo(self.ws_client.save_objects(params)[0])
+        if digest is not None:
+            self._saved_digests[info.reference] = digest
+        return info
+
+    def save_many(
+        self,
+        objects,
+        ws,
+        workers=DEFAULT_WORKERS,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_bytes=DEFAULT_SAVE_MAX_BYTES,
+    ):
+        """
+        Save many objects to a workspace. Objects are serialized by a pool of worker threads
+        and sent in save_objects calls of at most batch_size objects and max_bytes of JSON,
+        uploads overlap with the serialization of the following objects. Serialization is
+        pure Python and holds the GIL, worker threads do not serialize objects in parallel,
+        the gain comes from overlapping it with the save_objects requests.
+
+        :param objects: list of tuples (object_id, object_type, data) or
+            (object_id, object_type, data, meta)
+        :param ws: workspace id or name
+        :param workers: number of serialization threads (bounds the serialized objects
+            waiting to be sent)
+        :param batch_size: maximum number of objects per save_objects call
+        :param max_bytes: maximum JSON size (bytes) per save_objects call
+        :return: list of KBaseObjectInfo in the same order as objects, objects that failed to
+            serialize or save are returned as WorkspaceObjectError
+        """
+        results = [None] * len(objects)
+        batch = []
+        batch_bytes = 0
+
+        def serialize(item):
+            object_id, object_type, data = item[:3]
+            to_save, meta = self._serialize_object(
+                object_id, data, item[3] if len(item) > 3 else None
+            )
+            spec = {
+                "data": to_save,
+                "name": object_id,
+                "type": object_type,
+                "meta": meta,
+            }
+            return spec, _json_size(to_save)
+
+        def add(i, future):
+            nonlocal batch, batch_bytes
+            try:
+                spec, size = future.result()
+            except Exception as e:
+                logger.warning("unable to serialize %s: %s", objects[i][0], e)
+                results[i] = WorkspaceObjectError(objects[i][0], str(e))
+                return
+            if batch and (len(batch) >= batch_size or batch_bytes + size > max_bytes):
+                self._save_batch(ws, batch, results)
+                batch = []
+                batch_bytes = 0
+            batch.append((i, spec))
+            batch_bytes += size
+
+        # bounded window of serialized objects waiting to be sent
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for i, item in enumerate(objects):
+                pending.append((i, executor.submit(serialize, item)))
+                if len(pending) >= workers * 2:
+                    add(*pending.popleft())
+            while pending:
+                add(*pending.popleft())
+        if batch:
+            self._save_batch(ws, batch, results)
+        return results
+
+    def _save_batch(self, ws, batch, results):
+        provenance = self._build_provenance(
+            "save_many", [{"ws": ws, "object_ids": [spec["name"] for _, spec in batch]}]
+        )
+        params = {"objects": [dict(spec, provenance=provenance) for _, spec in batch]}
+        if isinstance(ws, int):
+            params["id"] = ws
+        else:
+            params["workspace"] = ws
+        try:
+            infos = self.ws_client.save_objects(params)
+        except Exception as e:
+            # e.g. ConnectionError once retries are exhausted, keep the other batches
+            logger.warning("save_objects of %d objects failed: %s", len(batch), e)
+            message = e.message if isinstance(e, ServerError) else str(e)
+            for i, spec in batch:
+                results[i] = WorkspaceObjectError(spec["name"], message)
+            return
+        for (i, _), info in zip(batch, infos):
+            results[i] = KBaseObjectInfo(info)
 
     def save_model(self, object_id, ws, data):
         return self.save_object(object_id, ws, "KBaseFBA.FBAModel", data)
@@ -308,11 +940,102 @@ class KBaseAPI:
             params["includeMetadata"] = 1
         return self.ws_client.list_objects(params)
 
+    def iter_objects(
+        self,
+        ws,
+        object_type=None,
+        page_size=DEFAULT_PAGE_SIZE,
+        include_metadata=False,
+    ):
+        """
+        Iterate the objects of a workspace (latest versions) with constant memory. Pages of
+        page_size objects are listed in object id order using minObjectID and limit.
+
+        :param ws: workspace id or name
+        :param object_type: object type filter (e.g., KBaseFBA.FBAModel)
+        :param page_size: objects per list_objects call (at most MAX_PAGE_SIZE)
+        :param include_metadata: include the user metadata in each info
+        :return: generator of KBaseObjectInfo
+        """
+        # a larger limit is capped by the server, a short page would look like the last one
+        page_size = min(page_size, MAX_PAGE_SIZE)
+        params = {"includeMetadata": 1 if include_metadata else 0, "limit": page_size}
+        if type(ws) == int:
+            params["ids"] = [ws]
+        else:
+            params["workspaces"] = [ws]
+        if object_type:
+            params["type"] = object_type
+        min_object_id = 1
+        while True:
+            params["minObjectID"] = min_object_id
+            page = self.ws_client.list_objects(params)
+            for info in page:
+                yield KBaseObjectInfo(info)
+            if len(page) < page_size:
+                return
+            min_object_id = page[-1][0] + 1
+
+    def _cached_info(self, id_or_ref, workspace=None):
+        if workspace is None and isinstance(id_or_ref, str):
+            return self._info_cache.get(id_or_ref)
+        return None
+
+    def _cache_info(self, info):
+        if info.reference:
+            self._info_cache[info.reference] = info
+
     def get_object_info(self, id_or_ref, workspace=None):
+        info = self._cached_info(id_or_ref, workspace)
+        if info is not None:
+            return info
         ref_data = self.ws_client.get_object_info3(
             {"objects": [self.process_workspace_identifiers(id_or_ref, workspace)]}
         )
-        return KBaseObjectInfo(ref_data["infos"][0])
+        info = KBaseObjectInfo(ref_data["infos"][0])
+        self._cache_info(info)
+        return info
+
+    def get_object_infos(self, refs, workspace=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Resolve many object infos with batched get_object_info3 calls. Infos are cached by
+        versioned reference (ws/obj/ver), versioned references already resolved are not
+        requested again.
+
+        :param refs: list of object references (or ids/names if workspace is given)
+        :param workspace: workspace id or name used to resolve non-reference ids
+        :param batch_size: maximum number of objects per call
+        :return: list of KBaseObjectInfo in the same order as refs, objects that failed to
+            resolve are returned as WorkspaceObjectError
+        """
+        results = [self._cached_info(ref, workspace) for ref in refs]
+        # unresolved reference -> positions in refs (duplicates are requested once)
+        pending = {}
+        for i, ref in enumerate(refs):
+            if results[i] is None:
+                pending.setdefault(ref, []).append(i)
+        pending_refs = list(pending)
+        for start in range(0, len(pending_refs), batch_size):
+            batch = pending_refs[start : start + batch_size]
+            specs = [self.process_workspace_identifiers(r, workspace) for r in batch]
+            try:
+                res = self.ws_client.get_object_info3(
+                    {"objects": specs, "ignoreErrors": 1}
+                )
+                infos = res["infos"]
+            except Exception as e:
+                message = e.message if isinstance(e, ServerError) else str(e)
+                logger.warning(message)
+                infos = [WorkspaceObjectError(ref, message) for ref in batch]
+            for ref, info in zip(batch, infos):
+                if info is None:
+                    info = WorkspaceObjectError(ref, "object not accessible")
+                elif not isinstance(info, WorkspaceObjectError):
+                    info = KBaseObjectInfo(info)
+                    self._cache_info(info)
+                for i in pending[ref]:
+                    results[i] = info
+        return results
 
     # TODO: this now seems obfuscated by get_object_info - can we delete this?
     def get_object_info_from_ref(self, ref):
@@ -322,19 +1045,76 @@ class KBaseAPI:
         return self.get_object_info(ref)
 
     def copy(self, from_id, from_ws, to_id, to_ws):
-        def copy_object(wclient, from_id, from_ws, to_id, to_ws):
-            params = {
-                "from": {"name": from_id, "workspace": from_ws},
-                "to": {"name": to_id, "workspace": to_ws},
-            }
-            return wclient.copy_object(params)
+        """
+        Copy an object server side (no data is transferred).
 
-        pass
+        :param from_id: source object id, name or reference (if from_ws is None)
+        :param from_ws: source workspace id or name
+        :param to_id: destination object name
+        :param to_ws: destination workspace id or name
+        :return: KBaseObjectInfo of the copy
+        """
+        params = {
+            "from": self.process_workspace_identifiers(from_id, from_ws),
+            "to": self.process_workspace_identifiers(to_id, to_ws),
+        }
+        return KBaseObjectInfo(self.ws_client.copy_object(params))
+
+    def _copy_one(self, from_ref, to_ws, to_id):
+        params = {
+            "from": self.process_workspace_identifiers(from_ref),
+            "to": self.process_workspace_identifiers(to_id, to_ws),
+        }
+        try:
+            with self._in_flight:
+                info = self._get_thread_ws_client().copy_object(params)
+        except Exception as e:
+            # e.g. ConnectionError or CircuitOpenError, keep the other copies
+            message = e.message if isinstance(e, ServerError) else str(e)
+            logger.warning("copy of %s failed: %s", from_ref, message)
+            return WorkspaceObjectError(from_ref, message)
+        return KBaseObjectInfo(info)
+
+    def copy_many(self, pairs, workers=DEFAULT_WORKERS):
+        """
+        Copy many objects server side with concurrent copy_object calls (bounded by workers
+        and the max_in_flight limit), only object metadata is transferred.
+
+        :param pairs: list of tuples (source reference, destination workspace) or
+            (source reference, destination workspace, destination name), without a name
+            the source object name is kept (resolved with one get_object_infos pass)
+        :return: list of KBaseObjectInfo of the copies in the same order as pairs, failed
+            copies are returned as WorkspaceObjectError
+        """
+        results = [None] * len(pairs)
+        copies = []
+        unnamed = [i for i, pair in enumerate(pairs) if len(pair) < 3]
+        infos = self.get_object_infos([pairs[i][0] for i in unnamed])
+        names = dict(zip(unnamed, infos))
+        for i, pair in enumerate(pairs):
+            to_id = pair[2] if len(pair) > 2 else names[i]
+            if isinstance(to_id, WorkspaceObjectError):
+                results[i] = to_id
+            elif isinstance(to_id, KBaseObjectInfo):
+                copies.append((i, pair[0], pair[1], to_id.id))
+            else:
+                copies.append((i, pair[0], pair[1], to_id))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (i, executor.submit(self._copy_one, from_ref, to_ws, to_id))
+                for i, from_ref, to_ws, to_id in copies
+            ]
+            for i, future in futures:
+                results[i] = future.result()
+        return results
 
     def get_workspace_info(self, ws_id_or_name):
         if type(ws_id_or_name) == str:
-            return self.ws_client.get_workspace_info({'workspace': ws_id_or_name})
+            return self.ws_client.get_workspace_info({"workspace": ws_id_or_name})
         elif type(ws_id_or_name) == int:
-            return self.ws_client.get_workspace_info({'id': ws_id_or_name})
+            return self.ws_client.get_workspace_info({"id": ws_id_or_name})
         else:
-            raise Exception(f'bad type {type(ws_id_or_name)} workspace identifier must be either int or str')
+            raise Exception(
+                f"bad type {type(ws_id_or_name)} workspace identifier must be either int or str"
+            )
@@ -0,0 +1,291 @@
+import os
+import json
+import random
+import asyncio
+import logging
+import aiohttp
+from cobrakbase.kbaseapi import (
+    KBaseAPI,
+    _get_token,
+    KBASE_WS_URL,
+    DEV_KBASE_WS_URL,
+    KBASE_HANDLE_URL,
+    KBASE_SHOCK_URL,
+    get_included_paths,
+)
+from cobrakbase.Workspace.baseclient import ServerError, _JSONObjectEncoder
+from cobrakbase.Workspace.retry import RetryPolicy, CircuitBreaker
+from cobrakbase.kbase_object_info import KBaseObjectInfo
+from cobrakbase.core.kbase_object_factory import KBaseObjectFactory
+from cobrakbase.exceptions import ShockException, WorkspaceObjectError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def _decode_rpc_response(content):
+    resp = json.loads(content)
+    if "result" not in resp:
+        raise ServerError("Unknown", 0, "An unknown server error occurred")
+    if not resp["result"]:
+        return
+    if len(resp["result"]) == 1:
+        return resp["result"][0]
+    return resp["result"]
+
+
+def _build_object(ws_data, partial=False):
+    return KBaseObjectFactory().create({"data": [ws_data]}, None, partial)
+
+
+class AsyncKBaseAPI:
+    """
+    asyncio version of KBaseAPI, calls share one aiohttp session and JSON decoding and
+    object construction run in an executor to keep the event loop free.
+
+    async with AsyncKBaseAPI(token) as api:
+        model = await api.get_from_ws("ref")
+    """
+
+    def __init__(
+        self,
+        token=None,
+        dev=False,
+        config=None,
+        public=False,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        timeout=30 * 60,
+        retry_policy=None,
+        executor=None,
+    ):
+        """
+
+        :param token: KBase token (default read from ~/.kbase/token)
+        :param dev: use appdev services
+        :param config: dict with workspace-url and optional handle-url and shock-url
+        :param public: anonymous access
+        :param max_connections: maximum number of open connections
+        :param timeout: total timeout in seconds for each call
+        :param retry_policy: RetryPolicy applied to every call
+        :param executor: concurrent.futures executor for decoding (default loop executor)
+        """
+        self._token = _get_token(token, public)
+        self.ws_url = DEV_KBASE_WS_URL if dev else KBASE_WS_URL
+        self.handle_url = KBASE_HANDLE_URL
+        self.shock_url = KBASE_SHOCK_URL
+        if config is not None:
+            self.ws_url = config["workspace-url"]
+            self.handle_url = config.get("handle-url", self.handle_url)
+            self.shock_url = config.get("shock-url", self.shock_url)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retry_policy = retry_policy
+        if self.retry_policy is None:
+            self.retry_policy = RetryPolicy(
+                circuit_breaker=CircuitBreaker(),
+                retryable_exceptions=(
+                    aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError,
+                ),
+            )
+        self.executor = executor
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _run_in_executor(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, fn, *args
+        )
+
+    async def _post(self, url, body):
+        headers = {}
+        if self._token:
+            headers["AUTHORIZATION"] = self._token
+        async with self._get_session().post(url, data=body, headers=headers) as resp:
+            content = await resp.read()
+            if resp.status == 500:
+                if resp.content_type == "application/json":
+                    err = json.loads(content)
+                    if "error" in err:
+                        raise ServerError(**err["error"])
+                raise ServerError("Unknown", 0, content.decode("utf-8", "replace"))
+            resp.raise_for_status()
+        return await self._run_in_executor(_decode_rpc_response, content)
+
+    async def call_method(self, method, params, url=None):
+        """
+        Call a JSON-RPC method (e.g., Workspace.get_objects2) with the retry policy.
+
+        :param method: service method name
+        :param params: list of method arguments
+        :param url: service url (default workspace)
+        :return: the method result
+        """
+        body = json.dumps(
+            {
+                "method": method,
+                "params": params,
+                "version": "1.1",
+                "id": str(random.random())[2:],
+            },
+            cls=_JSONObjectEncoder,
+        )
+        return await self.retry_policy.acall(
+            self._post, url or self.ws_url, body, description=method
+        )
+
+    async def get_objects2(self, args):
+        """
+        Same as KBaseAPI.get_objects2, missing or inaccessible objects return None.
+
+        :param args:
+        :return:
+        """
+        try:
+            return await self.call_method("Workspace.get_objects2", [args])
+        except ServerError as e:
+            if e.code in (-32400, -32500):
+                logger.warning(e.message)
+                return None
+            raise
+
+    async def get_object(self, object_id, ws=None):
+        res = await self.get_objects2(
+            {"objects": [KBaseAPI.process_workspace_identifiers(object_id, ws)]}
+        )
+        if res is None:
+            return None
+        return res["data"][0]["data"]
+
+    async def get_from_ws(
+        self, id_or_ref, workspace=None, included=None, projection=None
+    ):
+        """
+        Same as KBaseAPI.get_from_ws.
+        """
+        spec = KBaseAPI.process_workspace_identifiers(id_or_ref, workspace)
+        included = get_included_paths(included, projection)
+        if included:
+            spec["included"] = included
+        res = await self.get_objects2({"objects": [spec]})
+        if res is None:
+            return None
+        return await self._run_in_executor(
+            _build_object, res["data"][0], bool(included)
+        )
+
+    async def get_from_ws_many(self, refs, workspace=None, concurrency=None):
+        """
+        Fetch objects concurrently.
+
+        :param refs: list of object references (or ids/names if workspace is given)
+        :param workspace: workspace id or name used to resolve non-reference ids
+        :param concurrency: maximum concurrent fetches (default max_connections)
+        :return: list of objects in the same order as refs, objects that failed to fetch
+            are returned as WorkspaceObjectError
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def fetch(ref):
+            async with semaphore:
+                try:
+                    o = await self.get_from_ws(ref, workspace)
+                except ServerError as e:
+                    return WorkspaceObjectError(ref, e.message)
+                except Exception as e:
+                    # builder failures and errors left after retries
+                    logger.warning("unable to get %s: %s", ref, e)
+                    return WorkspaceObjectError(ref, str(e))
+            if o is None:
+                return WorkspaceObjectError(ref, "get_objects2 failed")
+            return o
+
+        return await asyncio.gather(*[fetch(ref) for ref in refs])
+
+    async def get_object_info3(self, params):
+        return await self.call_method("Workspace.get_object_info3", [params])
+
+    async def get_object_info(self, id_or_ref, workspace=None):
+        ref_data = await self.get_object_info3(
+            {"objects": [KBaseAPI.process_workspace_identifiers(id_or_ref, workspace)]}
+        )
+        return KBaseObjectInfo(ref_data["infos"][0])
+
+    async def list_objects(self, ws, object_type=None, include_metadata=False):
+        params = {"includeMetadata": 1 if include_metadata else 0}
+        if type(ws) == int:
+            params["ids"] = [ws]
+        else:
+            params["workspaces"] = [ws]
+        if object_type:
+            params["type"] = object_type
+        return await self.call_method("Workspace.list_objects", [params])
+
+    async def save_objects(self, params):
+        return await self.call_method("Workspace.save_objects", [params])
+
+    async def hids_to_handles(self, hids):
+        return await self.call_method(
+            "AbstractHandle.hids_to_handles", [hids], self.handle_url
+        )
+
+    async def download_file_from_kbase(
+        self, file_id, file_path, is_handle_ref=1, chunk_size=DEFAULT_CHUNK_SIZE
+    ):
+        """
+        Download a Shock node to file_path, if file_path is a directory the node file name is used.
+
+        :param file_id: handle id or shock node id
+        :param file_path: file or directory path
+        :param is_handle_ref: file_id is a handle id
+        :param chunk_size: read size in bytes
+        :return: path of the downloaded file
+        """
+        headers = {"Authorization": "OAuth " + self._token} if self._token else {}
+        file_name = None
+        if is_handle_ref == 1:
+            handles = await self.hids_to_handles([file_id])
+            file_id = handles[0]["id"]
+            file_name = handles[0].get("file_name")
+
+        node_url = self.shock_url + "/node/" + file_id
+        session = self._get_session()
+        if os.path.isdir(file_path):
+            if file_name is None:
+                async with session.get(node_url, headers=headers) as resp:
+                    if not resp.ok:
+                        raise ShockException(
+                            f"Error downloading file from shock node {file_id}"
+                        )
+                    file_name = (await resp.json())["data"]["file"]["name"]
+            file_path = os.path.join(file_path, file_name)
+
+        async with session.get(node_url + "?download_raw", headers=headers) as resp:
+            if not resp.ok:
+                raise ShockException(
+                    f"Error downloading file from shock node {file_id}"
+                )
+            with open(file_path, "wb") as fh:
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    fh.write(chunk)
+        return file_path
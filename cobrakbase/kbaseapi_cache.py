@@ -1,55 +1,450 @@
-import logging
-import os
-import json
-from cobrakbase.kbaseapi import KBaseAPI
-from cobrakbase.core.kbase_object_factory import KBaseObjectFactory
-
-logger = logging.getLogger(__name__)
-
-
-class KBaseCache(KBaseAPI):
-    """
-    API version that caches the json output in local filesystem for future access
-    """
-
-    def __init__(self, token=None, dev=False, config=None, path=None):
-        super().__init__(token, dev, config)
-        if path is None:
-            path = "~/.kbase/cache/" + ("dev" if dev else "prod")
-        if not os.path.exists(path):
-            os.makedirs(path)
-            logger.warning(f"created folder(s) [{path}]")
-        if not os.path.exists(path) or not os.path.isdir(path):
-            raise ValueError(f"path [{path}] does not exist or is not directory")
-        self.path = path
-
-    def get_from_ws(self, id_or_ref, workspace=None):
-        info = self.get_object_info(id_or_ref, workspace)
-        file_name = f"{info.id}.v{info.version}.json"
-        object_path = f"{self.path}/{info.workspace_uid}"
-
-        # we make the folder for the workspace if it does not exists
-        if not os.path.exists(object_path):
-            os.makedirs(object_path)
-            logger.warning(f"created folder(s) [{object_path}]")
-
-        # if json file does not exists fetch and save it otherwise read it from local
-        _data = None
-        if not os.path.exists(f"{object_path}/{file_name}"):
-            res = self.get_objects2(
-                {"objects": [self.process_workspace_identifiers(id_or_ref, workspace)]}
-            )
-            if res is None:
-                return None
-            _data = res["data"][0]
-            with open(f"{object_path}/{file_name}", "w") as fh:
-                fh.write(json.dumps(_data))
-            logger.debug(f"created file [{object_path}/{file_name}]")
-        else:
-            with open(f"{object_path}/{file_name}", "r") as fh:
-                _data = json.load(fh)
-
-        if _data is None:
-            return None
-        factory = KBaseObjectFactory()
-        return factory.create({"data": [_data]}, None)
+import re
+import time
+import random
+import logging
+import os
+import json
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from cobrakbase.kbaseapi import (
+    KBaseAPI,
+    get_included_paths,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_BATCH_MAX_BYTES,
+    DEFAULT_WORKERS,
+    _build_object,
+)
+from cobrakbase.core.kbase_object_factory import KBaseObjectFactory
+from cobrakbase.cache_store import ObjectStore, DEFAULT_CODEC, DEFAULT_LOCK_TIMEOUT
+from cobrakbase.cache_index import CacheIndex
+from cobrakbase.dependency_resolver import DependencyResolver, DEFAULT_MAX_DEPTH
+from cobrakbase.exceptions import WorkspaceObjectError, CacheIntegrityError
+
+logger = logging.getLogger(__name__)
+
+# ws_id/obj_id/ver references always point to the same object
+IMMUTABLE_REF = re.compile(r"^(\d+)/(\d+)/(\d+)$")
+VERSIONED_REF = re.compile(r"^[^/;]+/[^/;]+/\d+$")
+DEFAULT_RESOLVE_TTL = 300
+
+
+class KBaseCache(KBaseAPI):
+    """
+    API version that caches the json output in local filesystem for future access
+    """
+
+    def __init__(
+        self,
+        token=None,
+        dev=False,
+        config=None,
+        path=None,
+        resolve_ttl=DEFAULT_RESOLVE_TTL,
+        codec=DEFAULT_CODEC,
+        max_bytes=None,
+        memory_cache=None,
+        lock_timeout=DEFAULT_LOCK_TIMEOUT,
+        verify_sample=1.0,
+    ):
+        """
+
+        :param token:
+        :param dev:
+        :param config:
+        :param path: cache folder (default ~/.kbase/cache/prod or dev)
+        :param resolve_ttl: seconds to keep the resolution of unversioned references
+        :param codec: storage codec name (json, json.gz, json.zst) or JSONCodec
+        :param max_bytes: cache size budget, least recently used entries are evicted
+            when a new entry exceeds it (default unlimited)
+        :param memory_cache: ObjectMemoryCache of built objects (can be shared between
+            instances), default disabled
+        :param lock_timeout: seconds to wait for another process fetching the same object
+            before fetching it anyway
+        :param verify_sample: fraction of reads checking the data file digest (0 disables),
+            corrupt entries are quarantined and fetched again
+        """
+        super().__init__(token, dev, config)
+        if path is None:
+            path = "~/.kbase/cache/" + ("dev" if dev else "prod")
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            os.makedirs(path)
+            logger.warning(f"created folder(s) [{path}]")
+        if not os.path.exists(path) or not os.path.isdir(path):
+            raise ValueError(f"path [{path}] does not exist or is not directory")
+        self.path = path
+        self.resolve_ttl = resolve_ttl
+        self._resolved = {}
+        self.store = ObjectStore(path, codec)
+        self.index = CacheIndex(self.store)
+        self.max_bytes = max_bytes
+        self.memory_cache = memory_cache
+        self.lock_timeout = lock_timeout
+        self.verify_sample = verify_sample
+
+    def resolve(self, id_or_ref, workspace=None):
+        """
+        Resolve an object identifier to (workspace_uid, uid, version, name) without calling the
+        workspace for ws_id/obj_id/ver references. Other references are resolved with
+        get_object_info and kept in memory, versioned references never expire while
+        unversioned ones expire after resolve_ttl seconds.
+
+        :param id_or_ref:
+        :param workspace:
+        :return: tuple (workspace_uid, uid, version, name), name is None if not resolved
+        """
+        if workspace is None and isinstance(id_or_ref, str):
+            m = IMMUTABLE_REF.match(id_or_ref)
+            if m:
+                return int(m.group(1)), int(m.group(2)), int(m.group(3)), None
+        key = (id_or_ref, workspace)
+        cached = self._resolved.get(key)
+        if cached is not None and (cached[0] is None or cached[0] > time.time()):
+            return cached[1]
+        info = self.get_object_info(id_or_ref, workspace)
+        resolved = info.workspace_uid, info.uid, info.version, info.id
+        expires = None
+        if workspace is not None or not VERSIONED_REF.match(str(id_or_ref)):
+            expires = time.time() + self.resolve_ttl
+        self._resolved[key] = (expires, resolved)
+        return resolved
+
+    def _quarantine(self, ws_uid, uid, version):
+        self.store.quarantine_entry(ws_uid, uid, version)
+        self.index.remove(ws_uid, uid, version)
+
+    def _read_entry(self, ws_uid, uid, version, name=None):
+        verify = self.verify_sample > 0 and random.random() < self.verify_sample
+        try:
+            _data = self.store.read_entry(ws_uid, uid, version, verify)
+        except CacheIntegrityError as e:
+            logger.warning("quarantined corrupt cache entry %s", e)
+            self._quarantine(ws_uid, uid, version)
+            return None
+        if _data is not None:
+            self.index.touch(ws_uid, uid, version)
+            return _data
+        # plain json entries written by older versions
+        file_path = f"{self.path}/{ws_uid}/{uid}.v{version}.json"
+        if not os.path.exists(file_path) and name is not None:
+            file_path = f"{self.path}/{ws_uid}/{name}.v{version}.json"
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, "r") as fh:
+                return json.load(fh)
+        except ValueError as e:
+            # fetched again and stored as a regular entry
+            logger.warning("ignoring corrupt cache file %s: %s", file_path, e)
+            return None
+
+    def _write_entry(self, ws_uid, uid, version, ws_data):
+        file_path = self.store.write_entry(ws_uid, uid, version, ws_data)
+        logger.debug(f"created file [{file_path}]")
+        self.index.add(ws_uid, uid, version)
+        if self.max_bytes is not None:
+            self.index.evict(self.max_bytes)
+
+    def _fetch_entry(
+        self, id_or_ref, workspace, ws_uid, uid, version, name=None, stream=False
+    ):
+        """
+        Fetch and store an entry, single flight across threads and processes sharing the
+        cache folder: the first caller fetches while the others wait on the entry lock and
+        then read the stored entry.
+        """
+        with self.store.lock_entry(ws_uid, uid, version, self.lock_timeout) as locked:
+            if not locked:
+                logger.warning(
+                    "[%s/%s/%s] entry lock timeout, fetching", ws_uid, uid, version
+                )
+            _data = self._read_entry(ws_uid, uid, version, name)
+            if _data is not None:
+                return _data
+            spec = {"ref": f"{ws_uid}/{uid}/{version}"}
+            if isinstance(id_or_ref, str) and ";" in id_or_ref:
+                # keep reference paths, the object might only be reachable through them
+                spec = self.process_workspace_identifiers(id_or_ref, workspace)
+            res = self.get_objects2({"objects": [spec]}, stream=stream)
+            if res is None:
+                return None
+            _data = res["data"][0]
+            self._write_entry(ws_uid, uid, version, _data)
+            return _data
+
+    def _cached_key(self, id_or_ref, workspace=None):
+        """
+        :return: (ws_uid, uid, version) of ws_id/obj_id/ver references (or reference paths
+            ending with one) without calling the workspace, else None
+        """
+        if workspace is None and isinstance(id_or_ref, str):
+            m = IMMUTABLE_REF.match(id_or_ref.split(";")[-1])
+            if m:
+                return int(m.group(1)), int(m.group(2)), int(m.group(3))
+        return None
+
+    def get_from_ws_many(
+        self,
+        refs,
+        workspace=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_bytes=DEFAULT_BATCH_MAX_BYTES,
+        stream=False,
+        raw=False,
+    ):
+        """
+        KBaseAPI.get_from_ws_many reading ws_id/obj_id/ver references from the cache, the
+        other objects are fetched in batches and stored. Missing ws_id/obj_id/ver entries
+        are fetched holding their entry locks (single flight as in get_from_ws), objects of
+        other references are only stored if no other caller stored them first.
+        """
+        results = [None] * len(refs)
+        keys = {}
+        missing = []
+        unresolved = []
+        for i, ref in enumerate(refs):
+            key = self._cached_key(ref, workspace)
+            if key is None:
+                unresolved.append(i)
+                continue
+            keys[i] = key
+            results[i] = self._read_entry(*key)
+            if results[i] is None:
+                missing.append(i)
+
+        def fetch(indexes):
+            return KBaseAPI.get_from_ws_many(
+                self,
+                [refs[i] for i in indexes],
+                workspace,
+                batch_size,
+                max_bytes,
+                stream,
+                raw=True,
+            )
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            with ExitStack() as stack:
+                # sorted, callers locking overlapping batches cannot deadlock
+                for key in sorted({keys[i] for i in batch}):
+                    lock = self.store.lock_entry(*key, timeout=self.lock_timeout)
+                    if not stack.enter_context(lock):
+                        logger.warning("[%s/%s/%s] entry lock timeout, fetching", *key)
+                # stored by another caller while waiting for the locks
+                pending = []
+                for i in batch:
+                    results[i] = self._read_entry(*keys[i])
+                    if results[i] is None:
+                        pending.append(i)
+                for i, ws_data in zip(pending, fetch(pending) if pending else []):
+                    if not isinstance(ws_data, WorkspaceObjectError):
+                        self._write_entry(*keys[i], ws_data)
+                    results[i] = ws_data
+
+        if unresolved:
+            for i, ws_data in zip(unresolved, fetch(unresolved)):
+                if not isinstance(ws_data, WorkspaceObjectError):
+                    info = ws_data["info"]
+                    key = info[6], info[0], info[4]
+                    with self.store.lock_entry(*key, timeout=self.lock_timeout):
+                        if not self.store.has_entry(*key):
+                            self._write_entry(*key, ws_data)
+                results[i] = ws_data
+        if raw:
+            return results
+        factory = KBaseObjectFactory()
+        return [
+            o if isinstance(o, WorkspaceObjectError) else _build_object(factory, ref, o)
+            for ref, o in zip(refs, results)
+        ]
+
+    def warmup(
+        self,
+        refs=None,
+        workspace=None,
+        max_depth=DEFAULT_MAX_DEPTH,
+        batch_size=DEFAULT_BATCH_SIZE,
+    ):
+        """
+        Fetch objects and their dependency closure (genomes, templates, media, ...) into the
+        cache with batched get_objects2 calls, e.g., before export_bundle.
+
+        :param refs: list of object references
+        :param workspace: also fetch every object of this workspace (e.g., a narrative)
+        :param max_depth: levels of references to follow
+        :param batch_size: maximum number of objects per get_objects2 call
+        :return: list of cached references (ws_id/obj_id/ver), objects that failed to
+            fetch are returned as WorkspaceObjectError
+        """
+        roots = list(refs or [])
+        if workspace is not None:
+            roots += [info.reference for info in self.iter_objects(workspace)]
+        resolver = DependencyResolver(self, max_depth, batch_size=batch_size)
+        closure = resolver.resolve(roots)
+        return [
+            o if isinstance(o, WorkspaceObjectError) else o.info.reference
+            for o in closure.values()
+        ]
+
+    def export_bundle(self, bundle_path, refs=None):
+        """
+        Export cached entries to a single bundle file (tar with an index.json) that another
+        cache can import with import_bundle, e.g., to run without workspace access.
+
+        :param bundle_path: bundle file
+        :param refs: list of ws_id/obj_id/ver references (default every cached entry)
+        :return: list of exported references
+        """
+        keys = None
+        if refs is not None:
+            keys = [tuple(map(int, ref.split("/"))) for ref in refs]
+        return self.store.export_bundle(bundle_path, keys)
+
+    def import_bundle(self, bundle_path):
+        """
+        Import a bundle written by export_bundle, imported objects are served from the cache
+        when requested by ws_id/obj_id/ver reference (other references need the workspace to
+        be resolved).
+
+        :param bundle_path: bundle file
+        :return: list of imported references
+        """
+        imported = self.store.import_bundle(bundle_path)
+        for key in imported:
+            self.index.add(*key)
+        if self.max_bytes is not None:
+            self.index.evict(self.max_bytes)
+        return ["/".join(map(str, key)) for key in imported]
+
+    def check_integrity(self, workers=DEFAULT_WORKERS, repair=True):
+        """
+        Verify every cache entry (digest and decoding) with a pool of threads, corrupt
+        entries are quarantined (see ObjectStore.quarantine_entry) and fetched again.
+
+        :param workers: number of verification threads
+        :param repair: fetch quarantined entries again
+        :return: dict with the number of checked entries, corrupt entries (reference ->
+            problem), repaired references and failed repairs (reference -> error)
+        """
+        keys = list(self.store.iter_entries())
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            problems = list(executor.map(lambda k: self.store.verify_entry(*k), keys))
+        report = {"checked": len(keys), "corrupt": {}, "repaired": [], "failed": {}}
+        for key, problem in zip(keys, problems):
+            if problem is None:
+                continue
+            # check again holding the entry lock, another process may have replaced it
+            with self.store.lock_entry(*key, timeout=self.lock_timeout):
+                problem = self.store.verify_entry(*key)
+                if problem is None:
+                    continue
+                ref = "/".join(map(str, key))
+                logger.warning("[%s] quarantined corrupt cache entry: %s", ref, problem)
+                self._quarantine(*key)
+                report["corrupt"][ref] = problem
+        if repair and report["corrupt"]:
+            refs = list(report["corrupt"])
+            for ref, ws_data in zip(refs, self.get_from_ws_many(refs, raw=True)):
+                if isinstance(ws_data, WorkspaceObjectError):
+                    report["failed"][ref] = ws_data.message
+                else:
+                    report["repaired"].append(ref)
+        return report
+
+    def find_cached(self, object_type=None, workspace=None, name_prefix=None):
+        """
+        Query the cache index without touching the workspace.
+
+        :param object_type: object type without version (e.g., KBaseFBA.FBAModel)
+        :param workspace: workspace id
+        :param name_prefix: object name prefix
+        :return: list of KBaseObjectInfo
+        """
+        return self.index.find(object_type, workspace, name_prefix)
+
+    def cache_size(self):
+        """
+        :return: bytes used by indexed entries
+        """
+        return self.index.total_bytes()
+
+    def evict(self, max_bytes=None):
+        """
+        Evict least recently used entries down to max_bytes (default the cache budget).
+
+        :return: list of evicted references
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_bytes is None:
+            return []
+        return self.index.evict(max_bytes)
+
+    def rebuild_index(self):
+        """
+        Index every entry in the cache folder, e.g., after copying a cache from another host.
+
+        :return: number of indexed entries
+        """
+        return self.index.rebuild()
+
+    def _get_subset(self, ref, included, stream=False):
+        # subsets are not written to disk, the store holds one full entry per version
+        key = ref + "?" + ",".join(included)
+        if self.memory_cache is not None:
+            o = self.memory_cache.get(key)
+            if o is not None:
+                return o
+        spec = {"ref": ref, "included": included}
+        res = self.get_objects2({"objects": [spec]}, stream=stream)
+        if res is None:
+            return None
+        o = KBaseObjectFactory().create(res, None, partial=True)
+        if self.memory_cache is not None:
+            self.memory_cache.put(key, o, res["data"][0]["info"][9] or 0)
+        return o
+
+    def get_from_ws(
+        self, id_or_ref, workspace=None, included=None, projection=None, stream=False
+    ):
+        """
+        Get an object from the local cache, fetching and storing it on a miss. Subsets
+        (included paths or a projection) are fetched from the workspace and only kept in
+        the memory cache.
+
+        :param id_or_ref:
+        :param workspace:
+        :param included: list of object paths to fetch
+        :param projection: named projection from PROJECTIONS
+        :param stream: parse workspace responses incrementally (requires ijson)
+        :return:
+        """
+        ws_uid, uid, version, name = self.resolve(id_or_ref, workspace)
+        ref = f"{ws_uid}/{uid}/{version}"
+        included = get_included_paths(included, projection)
+        if included:
+            if isinstance(id_or_ref, str) and ";" in id_or_ref:
+                return super().get_from_ws(
+                    id_or_ref, workspace, included, stream=stream
+                )
+            return self._get_subset(ref, included, stream)
+        if self.memory_cache is not None:
+            o = self.memory_cache.get(ref)
+            if o is not None:
+                return o
+
+        # if json file does not exists fetch and save it otherwise read it from local
+        _data = self._read_entry(ws_uid, uid, version, name)
+        if _data is None:
+            _data = self._fetch_entry(
+                id_or_ref, workspace, ws_uid, uid, version, name, stream
+            )
+            if _data is None:
+                return None
+
+        factory = KBaseObjectFactory()
+        o = factory.create({"data": [_data]}, None)
+        if self.memory_cache is not None:
+            self.memory_cache.put(ref, o, _data["info"][9] or 0)
+        return o
@@ -0,0 +1,98 @@
+import copy
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MODE_SHARED = "shared"
+MODE_COPY = "copy"
+
+
+class ObjectMemoryCache:
+    """
+    In-process LRU of built KBase objects keyed by resolved reference (ws_id/obj_id/ver)
+    and bounded by an approximate memory budget.
+
+    Modes:
+        shared - lookups return the cached instance, callers must treat it as read-only
+        copy - the object is pickled once when stored and each lookup unpickles a new copy
+            (objects that cannot be pickled are deep copied)
+    """
+
+    def __init__(self, max_bytes=2 * 1024**3, mode=MODE_COPY):
+        if mode not in (MODE_SHARED, MODE_COPY):
+            raise ValueError(f"invalid mode [{mode}] expected shared or copy")
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """
+        :param key: resolved reference
+        :return: object (a copy in copy mode) or None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+        value, pickled, _ = item
+        if pickled:
+            return pickle.loads(value)
+        if self.mode == MODE_COPY:
+            return copy.deepcopy(value)
+        return value
+
+    def put(self, key, obj, size_estimate=0):
+        """
+        Store an object, least recently used objects are dropped to fit max_bytes.
+
+        :param key: resolved reference
+        :param obj: built object
+        :param size_estimate: approximate size in bytes (e.g., object info size), in copy mode
+            the pickled size is used when available
+        """
+        value = obj
+        pickled = False
+        size = size_estimate
+        if self.mode == MODE_COPY:
+            try:
+                value = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+                pickled = True
+                size = len(value)
+            except Exception as e:
+                logger.debug("[%s] unable to pickle, using deepcopy: %s", key, e)
+                value = copy.deepcopy(obj)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._size -= self._items.pop(key)[2]
+            self._items[key] = (value, pickled, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
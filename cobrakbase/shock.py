@@ -0,0 +1,377 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cobrakbase.exceptions import ShockException
+from cobrakbase.Workspace.instrumentation import CallRecord, emit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+PART_SUFFIX = ".part"
+DEFAULT_UPLOAD_STATE_PATH = "~/.kbase/shock-uploads"
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads to cap the total transfer rate in bytes per second.
+    """
+
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self._allowance = bytes_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.bytes_per_second,
+                self._allowance + (now - self._last) * self.bytes_per_second,
+            )
+            self._last = now
+            self._allowance -= n
+            wait = -self._allowance / self.bytes_per_second
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ShockClient:
+    """
+    Shock node transfers. Downloads: chunked streaming, Range resume of partial files and md5
+    checks. Uploads: multipart (parts) nodes streamed one chunk at a time, resumable from a
+    local state file.
+    """
+
+    def __init__(
+        self,
+        url,
+        token=None,
+        session=None,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        hooks=None,
+        upload_state_path=DEFAULT_UPLOAD_STATE_PATH,
+    ):
+        """
+
+        :param url: shock api url
+        :param token: KBase token
+        :param session: requests.Session (see Workspace.baseclient.create_session)
+        :param chunk_size: bytes per read when streaming and bytes per uploaded part
+        :param hooks: callables receiving a CallRecord (shock.get_node, shock.download,
+            shock.upload) after each call, see Workspace.instrumentation
+        :param upload_state_path: folder of the resume state of uploads, kept apart from the
+            uploaded files (input folders may be read-only)
+        """
+        if session is None:
+            from cobrakbase.Workspace.baseclient import create_session
+
+            session = create_session()
+        self.url = url
+        self.session = session
+        self.chunk_size = chunk_size
+        self.hooks = list(hooks or [])
+        self.upload_state_path = os.path.expanduser(upload_state_path)
+        self._headers = {}
+        if token:
+            self._headers["Authorization"] = "OAuth " + token
+
+    def _instrument(self, method, fn, *args, **kwargs):
+        if not self.hooks:
+            return fn(*args, **kwargs)
+        record = CallRecord(method, self.url)
+        record.attempts = 1
+        error = None
+        try:
+            return fn(*args, record=record, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            record.finish(error)
+            emit(self.hooks, record)
+
+    def get_node(self, node_id):
+        """
+        :param node_id:
+        :return: node data (file name, size, checksums, attributes)
+        """
+        return self._instrument("shock.get_node", self._get_node, node_id)
+
+    def _get_node(self, node_id, record=None):
+        r = self.session.get(
+            f"{self.url}/node/{node_id}", headers=self._headers, allow_redirects=True
+        )
+        if not r.ok:
+            raise ShockException(
+                f"Error downloading file from shock node {node_id}: {r.status_code}"
+            )
+        if record:
+            record.bytes_received = len(r.content)
+        return r.json()["data"]
+
+    def download(
+        self, node_id, file_path, file_name=None, md5=None, resume=True, limiter=None
+    ):
+        """
+        Stream a node to a file. Data is written to {file_path}.part and renamed when complete,
+        an existing .part file is resumed with an HTTP Range request.
+
+        :param node_id: shock node id
+        :param file_path: file path or directory (the node file name is used)
+        :param file_name: node file name, avoids fetching the node metadata for directories
+        :param md5: expected md5, if not given and the node metadata is fetched its md5 is used
+        :param resume: resume partial downloads
+        :param limiter: RateLimiter shared by concurrent downloads
+        :return: path of the downloaded file
+        """
+        return self._instrument(
+            "shock.download",
+            self._download,
+            node_id,
+            file_path,
+            file_name,
+            md5,
+            resume,
+            limiter,
+        )
+
+    def _download(
+        self, node_id, file_path, file_name, md5, resume, limiter, record=None
+    ):
+        if os.path.isdir(file_path):
+            if file_name is None:
+                node = self.get_node(node_id)
+                file_name = node["file"]["name"]
+                if not node["file"]["size"]:
+                    raise ShockException(f"Node {node_id} has no file")
+                if md5 is None:
+                    md5 = node["file"].get("checksum", {}).get("md5")
+            file_path = os.path.join(file_path, file_name)
+
+        part_path = file_path + PART_SUFFIX
+        md5_hash = hashlib.md5()
+        offset = 0
+        if resume and os.path.exists(part_path):
+            with open(part_path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(self.chunk_size), b""):
+                    md5_hash.update(chunk)
+                    offset += len(chunk)
+        headers = dict(self._headers)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+
+        with self.session.get(
+            f"{self.url}/node/{node_id}?download_raw",
+            stream=True,
+            headers=headers,
+            allow_redirects=True,
+        ) as r:
+            if r.status_code == 416:
+                # nothing left to download
+                pass
+            elif not r.ok:
+                raise ShockException(
+                    f"Error downloading file from shock node {node_id}: {r.status_code}"
+                )
+            else:
+                if offset and r.status_code != 206:
+                    logger.debug("[%s] server ignored range, restarting", node_id)
+                    md5_hash = hashlib.md5()
+                    offset = 0
+                with open(part_path, "ab" if offset else "wb") as fh:
+                    for chunk in r.iter_content(self.chunk_size):
+                        if limiter:
+                            limiter.consume(len(chunk))
+                        md5_hash.update(chunk)
+                        fh.write(chunk)
+                        if record:
+                            record.add_received(len(chunk))
+
+        if md5 and md5_hash.hexdigest() != md5:
+            os.remove(part_path)
+            raise ShockException(
+                f"Checksum mismatch for shock node {node_id}: "
+                f"expected {md5} got {md5_hash.hexdigest()}"
+            )
+        os.replace(part_path, file_path)
+        return file_path
+
+    def download_many(self, downloads, workers=4, max_bytes_per_second=None):
+        """
+        Download many nodes concurrently.
+
+        :param downloads: list of dicts with download arguments (node_id, file_path and
+            optionally file_name and md5)
+        :param workers: maximum concurrent downloads
+        :param max_bytes_per_second: total bandwidth cap (default unlimited)
+        :return: list of file paths in the same order, failed downloads are returned as
+            ShockException
+        """
+        limiter = RateLimiter(max_bytes_per_second) if max_bytes_per_second else None
+
+        def download(kwargs):
+            try:
+                return self.download(limiter=limiter, **kwargs)
+            except Exception as e:
+                logger.warning("download of %s failed: %s", kwargs.get("node_id"), e)
+                if isinstance(e, ShockException):
+                    return e
+                return ShockException(f"{kwargs.get('node_id')}: {e}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(download, downloads))
+
+    def _node_request(self, method, url, node_id=None, **kwargs):
+        r = self.session.request(method, url, headers=self._headers, **kwargs)
+        if not r.ok:
+            raise ShockException(
+                f"Error uploading file to shock node {node_id}: {r.status_code}"
+            )
+        return r.json()["data"]
+
+    def _upload_state_file(self, file_path):
+        file_path = os.path.abspath(file_path)
+        key = hashlib.sha1(f"{self.url}\n{file_path}".encode("utf-8")).hexdigest()
+        return os.path.join(self.upload_state_path, key + ".json")
+
+    @staticmethod
+    def _read_upload_state(state_path, stat, chunk_size):
+        try:
+            with open(state_path, "r") as fh:
+                state = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        # the file changed (or the part size) since the upload started
+        if [state["size"], state["mtime"], state["chunk_size"]] != [
+            stat.st_size,
+            stat.st_mtime,
+            chunk_size,
+        ]:
+            return None
+        return state
+
+    @staticmethod
+    def _write_upload_state(state_path, state):
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, state_path)
+
+    def upload(self, file_path, file_name=None, resume=True, limiter=None):
+        """
+        Upload a file to a new multipart node, the file is read and sent one chunk_size part
+        at a time. With resume, progress is kept in a state file under upload_state_path and
+        an interrupted upload of an unchanged file resumes with the missing parts of the same
+        node.
+
+        :param file_path: file to upload
+        :param file_name: node file name (default the file base name)
+        :param resume: keep progress and resume interrupted uploads
+        :param limiter: RateLimiter shared by concurrent uploads
+        :return: dict with the node id, file_name, size and md5
+        """
+        return self._instrument(
+            "shock.upload", self._upload, file_path, file_name, resume, limiter
+        )
+
+    def _upload(self, file_path, file_name, resume, limiter, record=None):
+        if file_name is None:
+            file_name = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        state_path = None
+        parts = max(1, -(-stat.st_size // self.chunk_size))
+        state = None
+        if resume:
+            os.makedirs(self.upload_state_path, exist_ok=True)
+            state_path = self._upload_state_file(file_path)
+            state = self._read_upload_state(state_path, stat, self.chunk_size)
+        if state is None:
+            node = self._node_request(
+                "POST",
+                f"{self.url}/node",
+                files={"parts": (None, str(parts)), "file_name": (None, file_name)},
+            )
+            state = {
+                "node_id": node["id"],
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "chunk_size": self.chunk_size,
+                "parts": [],
+            }
+            if state_path:
+                self._write_upload_state(state_path, state)
+        else:
+            logger.debug(
+                "[%s] resuming upload, %d/%d parts done",
+                state["node_id"],
+                len(state["parts"]),
+                parts,
+            )
+        node_id = state["node_id"]
+        done = set(state["parts"])
+
+        md5_hash = hashlib.md5()
+        with open(file_path, "rb") as fh:
+            for part in range(1, parts + 1):
+                chunk = fh.read(self.chunk_size)
+                md5_hash.update(chunk)
+                if part in done:
+                    continue
+                if limiter:
+                    limiter.consume(len(chunk))
+                self._node_request(
+                    "PUT",
+                    f"{self.url}/node/{node_id}",
+                    node_id,
+                    files={str(part): (file_name, chunk)},
+                )
+                if record:
+                    record.bytes_sent += len(chunk)
+                state["parts"].append(part)
+                if state_path:
+                    self._write_upload_state(state_path, state)
+
+        md5 = md5_hash.hexdigest()
+        node = self.get_node(node_id)
+        remote_md5 = node.get("file", {}).get("checksum", {}).get("md5")
+        if state_path:
+            os.remove(state_path)
+        if remote_md5 and remote_md5 != md5:
+            raise ShockException(
+                f"Checksum mismatch for shock node {node_id}: "
+                f"expected {md5} got {remote_md5}"
+            )
+        return {"id": node_id, "file_name": file_name, "size": stat.st_size, "md5": md5}
+
+    def upload_many(self, uploads, workers=4, max_bytes_per_second=None, callback=None):
+        """
+        Upload many files concurrently.
+
+        :param uploads: list of dicts with upload arguments (file_path and optionally
+            file_name)
+        :param workers: maximum concurrent uploads
+        :param max_bytes_per_second: total bandwidth cap (default unlimited)
+        :param callback: function called with each uploaded node (in the upload thread),
+            its return value replaces the node in the results
+        :return: list of nodes (see upload) in the same order, failed uploads are returned
+            as ShockException
+        """
+        limiter = RateLimiter(max_bytes_per_second) if max_bytes_per_second else None
+
+        def upload(kwargs):
+            try:
+                node = self.upload(limiter=limiter, **kwargs)
+                return callback(node) if callback else node
+            except Exception as e:
+                logger.warning("upload of %s failed: %s", kwargs.get("file_path"), e)
+                if isinstance(e, ShockException):
+                    return e
+                return ShockException(f"{kwargs.get('file_path')}: {e}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(upload, uploads))
@@ -30,5 +30,10 @@ setup(
         "networkx >= 2.4",
         "modelseedpy >= 0.3.0",
     ],
+    extras_require={
+        "async": ["aiohttp >= 3.7"],
+        "cache": ["zstandard", "orjson"],
+        "stream": ["ijson >= 3.1"],
+    },
     zip_safe=True,
 )
@@ -0,0 +1,80 @@
+import pytest
+import requests
+from cobrakbase.Workspace.baseclient import ServerError
+from cobrakbase.Workspace.retry import RetryPolicy, CircuitBreaker, CircuitOpenError
+
+
+class Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retry_transient_errors():
+    fn = Flaky([requests.ConnectionError(), ServerError("Unknown", 0, "proxy")])
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    assert policy.call(fn) == "ok"
+    assert fn.calls == 3
+
+
+def test_no_retry_for_server_errors():
+    fn = Flaky([ServerError("JSONRPCError", -32500, "No object")])
+    with pytest.raises(ServerError):
+        RetryPolicy(base_delay=0).call(fn)
+    assert fn.calls == 1
+
+
+def test_retry_gives_up():
+    fn = Flaky([requests.Timeout()] * 5)
+    with pytest.raises(requests.Timeout):
+        RetryPolicy(max_attempts=2, base_delay=0).call(fn)
+    assert fn.calls == 2
+
+
+def test_retry_total_time_budget():
+    fn = Flaky([requests.Timeout()] * 5)
+    # without jitter the first delay (10s) is always over the budget
+    policy = RetryPolicy(max_attempts=5, base_delay=10, max_total_time=1, jitter=False)
+    with pytest.raises(requests.Timeout):
+        policy.call(fn)
+    assert fn.calls == 1
+
+
+def test_delay_backoff_and_jitter():
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+    assert [policy.get_delay(i) for i in range(4)] == [1, 2, 4, 5]
+    policy.jitter = True
+    assert all(0 <= policy.get_delay(3) <= 5 for _ in range(20))
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=1, circuit_breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            policy.call(Flaky([requests.ConnectionError()]))
+    assert breaker.is_open
+    fn = Flaky([])
+    with pytest.raises(CircuitOpenError):
+        policy.call(fn)
+    assert fn.calls == 0
+    breaker.reset_timeout = 0
+    assert policy.call(fn) == "ok"
+    assert not breaker.is_open
+
+
+def test_no_retry_for_non_idempotent_methods():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    fn = Flaky([requests.Timeout()])
+    with pytest.raises(requests.Timeout):
+        policy.call(fn, description="Workspace.save_objects")
+    assert fn.calls == 1
+    # the connection was never established, the request can be sent again
+    fn = Flaky([requests.ConnectTimeout()])
+    assert policy.call(fn, description="Workspace.save_objects") == "ok"
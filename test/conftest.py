@@ -0,0 +1,21 @@
+import pytest
+from test_data.stub_server import WorkspaceStub, make_objects
+
+
+@pytest.fixture
+def workspace_stub():
+    """
+    WorkspaceStub with obj1, obj2 and obj3 (1/1/1 to 1/3/1), modules override it for other
+    content
+    """
+    return WorkspaceStub(make_objects(range(1, 4)))
+
+
+@pytest.fixture
+def stub_url(workspace_stub):
+    """
+    URL of workspace_stub served over HTTP for the duration of the test
+    """
+    url = workspace_stub.start()
+    yield url
+    workspace_stub.stop()
@@ -0,0 +1,60 @@
+import time
+from test_data.stub_server import make_info
+from cobrakbase.cache_store import ObjectStore
+from cobrakbase.cache_index import CacheIndex
+
+
+def _ws_data(obj_id, checksum, object_type="KBaseFBA.FBAModel-14.0"):
+    info = make_info(1, obj_id, f"model_{obj_id}", object_type, checksum=checksum)
+    # same checksum, same data
+    return {"data": {"payload": "x" * 1000, "checksum": checksum}, "info": info}
+
+
+def _index(tmp_path, n, checksum=None):
+    store = ObjectStore(str(tmp_path), "json")
+    index = CacheIndex(store)
+    for i in range(1, n + 1):
+        store.write_entry(1, i, 1, _ws_data(i, checksum or f"{i:032x}"))
+        index.add(1, i, 1)
+    return store, index
+
+
+def test_find(tmp_path):
+    store, index = _index(tmp_path, 3)
+    store.write_entry(1, 9, 1, _ws_data(9, "f" * 32, "KBaseBiochem.Media-2.0"))
+    index.add(1, 9, 1)
+    assert [i.id for i in index.find("KBaseFBA.FBAModel")] == [
+        "model_1",
+        "model_2",
+        "model_3",
+    ]
+    assert [i.id for i in index.find(name_prefix="model_9")] == ["model_9"]
+    assert index.find(workspace=2) == []
+
+
+def test_evict_lru(tmp_path):
+    store, index = _index(tmp_path, 4)
+    time.sleep(0.01)
+    index.touch(1, 1, 1)
+    entry_size = index.total_bytes() // 4
+    evicted = index.evict(entry_size * 2)
+    assert evicted == ["1/2/1", "1/3/1"]
+    assert store.read_entry(1, 2, 1) is None
+    assert store.read_entry(1, 1, 1) is not None
+    assert index.total_bytes() <= entry_size * 2
+
+
+def test_evict_keeps_shared_blob(tmp_path):
+    store, index = _index(tmp_path, 2, checksum="a" * 32)
+    index.remove(1, 1, 1)
+    assert store.read_entry(1, 2, 1, verify=True)["data"]["checksum"] == "a" * 32
+    index.remove(1, 2, 1)
+    assert index.total_bytes() == 0
+
+
+def test_rebuild(tmp_path):
+    store, index = _index(tmp_path, 3)
+    index.close()
+    index = CacheIndex(store, str(tmp_path / "other.sqlite"))
+    assert index.rebuild() == 3
+    assert len(index) == 3
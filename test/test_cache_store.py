@@ -0,0 +1,86 @@
+import os
+import time
+import pytest
+from test_data.stub_server import make_info
+from cobrakbase.cache_store import ObjectStore, JSONCodec, get_codec
+
+
+def _ws_data(obj_id, checksum, data):
+    info = make_info(1, obj_id, f"obj{obj_id}", checksum=checksum)
+    return {"data": data, "info": info, "provenance": []}
+
+
+@pytest.mark.parametrize("name", ["json", "json.gz"])
+def test_codec_roundtrip(name):
+    codec = get_codec(name)
+    data = {"a": [1, 2.5, "x", None], "b": {"c": True}}
+    assert codec.decode(codec.encode(data)) == data
+    assert codec.extension == "." + name
+
+
+def test_codec_deterministic(monkeypatch):
+    codec = get_codec("json.gz")
+    content = codec.encode({"x": 1})
+    monkeypatch.setattr(time, "time", lambda: 1e9)
+    assert codec.encode({"x": 1}) == content
+
+
+def test_codec_json_backend():
+    codec = JSONCodec(None, json_backend="json")
+    assert codec.decode(codec.encode({1: "a"})) == {"1": "a"}
+
+
+def test_store_roundtrip_and_dedup(tmp_path):
+    store = ObjectStore(str(tmp_path))
+    store.write_entry(1, 1, 1, _ws_data(1, "abc123", {"x": 1}))
+    store.write_entry(1, 2, 1, _ws_data(2, "abc123", {"x": 1}))
+    assert store.read_entry(1, 2, 1)["data"] == {"x": 1}
+    assert store.read_entry(1, 2, 1)["info"][1] == "obj2"
+    assert store.read_entry(1, 3, 1) is None
+    assert os.listdir(tmp_path / "objects" / "ab") == ["abc123" + store.codec.extension]
+
+
+@pytest.mark.parametrize("name", ["json", "json.gz"])
+def test_store_replaces_damaged_data(tmp_path, name):
+    store = ObjectStore(str(tmp_path), name)
+    store.write_entry(1, 1, 1, _ws_data(1, "abc123", {"x": 1}))
+    with open(store.blob_path("abc123"), "wb") as fh:
+        fh.write(b"damaged")
+    store.write_entry(1, 2, 1, _ws_data(2, "abc123", {"x": 1}))
+    assert store.read_entry(1, 2, 1, verify=True)["data"] == {"x": 1}
+    # the rewritten data file still matches the digest of the first entry
+    assert store.verify_entry(1, 1, 1) is None
+
+
+def test_quarantine_keeps_shared_data(tmp_path):
+    store = ObjectStore(str(tmp_path), "json.gz")
+    for uid in (1, 2, 3):
+        store.write_entry(1, uid, 1, _ws_data(uid, "abc123", {"x": 1}))
+    store.quarantine_entry(1, 1, 1)
+    assert store.read_entry(1, 1, 1) is None
+    assert store.verify_entry(1, 2, 1) is None
+
+    # data files that do not decode are moved
+    with open(store.blob_path("abc123"), "wb") as fh:
+        fh.write(b"damaged")
+    store.quarantine_entry(1, 2, 1)
+    assert not os.path.exists(store.blob_path("abc123"))
+    assert store.verify_entry(1, 3, 1) == "missing entry or data"
+
+
+def test_store_without_checksum(tmp_path):
+    store = ObjectStore(str(tmp_path), "json")
+    store.write_entry(1, 1, 1, _ws_data(1, None, {"x": 1}))
+    assert store.read_entry(1, 1, 1)["data"] == {"x": 1}
+
+
+def test_entry_lock(tmp_path):
+    store = ObjectStore(str(tmp_path))
+    with store.lock_entry(1, 2, 3) as locked:
+        assert locked
+        with store.lock_entry(1, 2, 3, timeout=0.1) as other:
+            assert not other
+        with store.lock_entry(1, 2, 4, timeout=0.1) as other:
+            assert other
+    with store.lock_entry(1, 2, 3, timeout=0.1) as locked:
+        assert locked
@@ -0,0 +1,358 @@
+import json
+import hashlib
+import threading
+from email.parser import BytesParser
+from cobrakbase.Workspace.baseclient import ServerError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def make_info(
+    ws_id,
+    obj_id,
+    name,
+    object_type="KBaseTest.Object-1.0",
+    ver=1,
+    checksum="md5",
+    size=10,
+):
+    return [
+        obj_id,
+        name,
+        object_type,
+        "2020-01-01T00:00:00+0000",
+        ver,
+        "user",
+        ws_id,
+        f"ws{ws_id}",
+        checksum,
+        size,
+        {},
+    ]
+
+
+def data_checksum(data):
+    # md5 of the canonical JSON, as computed by the workspace
+    content = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def make_objects(ids, ws_id=1, **kwargs):
+    """
+    Objects {"id": "obj<i>"} named obj<i> for each object id, keyed by reference
+
+    :param kwargs: make_info arguments (object_type, size)
+    """
+    objects = {}
+    for i in ids:
+        data = {"id": f"obj{i}"}
+        info = make_info(ws_id, i, f"obj{i}", checksum=data_checksum(data), **kwargs)
+        objects[f"{ws_id}/{i}/1"] = {"data": data, "info": info}
+    return objects
+
+
+def _select(data, parts, out):
+    # copy the values at an included path (e.g., features/[*]/id) of data into out
+    key, rest = parts[0], parts[1:]
+    if key == "[*]":
+        for i, value in enumerate(data):
+            if not rest:
+                out[i] = value
+            elif isinstance(value, (dict, list)):
+                _select(value, rest, out[i])
+        return
+    if key not in data:
+        return
+    if not rest:
+        out[key] = data[key]
+    else:
+        if key not in out:
+            out[key] = [{} for _ in data[key]] if isinstance(data[key], list) else {}
+        _select(data[key], rest, out[key])
+
+
+def parse_form(content_type, body):
+    # multipart/form-data fields -> bytes
+    message = BytesParser().parsebytes(
+        b"content-type: " + content_type.encode() + b"\r\n\r\n" + body
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(
+            decode=True
+        )
+        for part in message.get_payload()
+    }
+
+
+def project(data, included):
+    out = {}
+    for path in included:
+        _select(data, path.split("/"), out)
+    return out
+
+
+class WorkspaceStub:
+    """
+    Minimal local stand-in for the workspace JSON-RPC and Shock services
+    """
+
+    def __init__(self, objects=None, files=None):
+        """
+
+        :param objects: dict of ref -> {"data": ..., "info": [...]}
+        :param files: dict of shock node id -> bytes
+        """
+        self.objects = objects or {}
+        self.files = files or {}
+        # shock node id -> handle file name (default the node id)
+        self.file_names = {}
+        # node id -> {"parts": count, "file_name": ..., "data": {part: bytes}}
+        self.uploads = {}
+        self.handles = {}
+        # fail part uploads after this many parts (None never fails)
+        self.fail_after = None
+        self.calls = []
+        # (method, params) of every call
+        self.requests = []
+        self.moddate = 0
+        self._server = None
+
+    def _lookup(self, spec):
+        if "ref" in spec:
+            # reference paths resolve to their last object
+            return self.objects.get(spec["ref"].split(";")[-1])
+        found = None
+        for o in self.objects.values():
+            info = o["info"]
+            if info[6] == spec.get("wsid") or info[7] == spec.get("workspace"):
+                if info[1] == spec.get("name") or info[0] == spec.get("objid"):
+                    # latest version
+                    if found is None or info[4] > found["info"][4]:
+                        found = o
+        return found
+
+    def _lookup_all(self, params):
+        found = [self._lookup(spec) for spec in params["objects"]]
+        if None in found and not params.get("ignoreErrors"):
+            raise KeyError("No object with such reference")
+        return found
+
+    def get_objects2(self, params):
+        found = self._lookup_all(params)
+        for i, spec in enumerate(params["objects"]):
+            if found[i] is not None and spec.get("included"):
+                found[i] = dict(
+                    found[i], data=project(found[i]["data"], spec["included"])
+                )
+        return [{"data": found}]
+
+    def get_object_info3(self, params):
+        infos = [o and o["info"] for o in self._lookup_all(params)]
+        return [{"infos": infos, "paths": [[]] * len(infos)}]
+
+    def list_objects(self, params):
+        infos = []
+        for o in self.objects.values():
+            info = o["info"]
+            if params.get("ids") and info[6] not in params["ids"]:
+                continue
+            if params.get("workspaces") and info[7] not in params["workspaces"]:
+                continue
+            if params.get("type") and not info[2].startswith(params["type"]):
+                continue
+            if info[0] < params.get("minObjectID", 0):
+                continue
+            if info[0] > params.get("maxObjectID", info[0]):
+                continue
+            infos.append(info)
+        infos.sort(key=lambda x: x[0])
+        # the workspace caps limit at 10000
+        return [infos[: min(params.get("limit", 10000), 10000)]]
+
+    def get_workspace_info(self, params):
+        infos = [
+            o["info"]
+            for o in self.objects.values()
+            if o["info"][6] == params.get("id")
+            or o["info"][7] == params.get("workspace")
+        ]
+        ws_id = params.get("id") or infos[0][6]
+        max_id = max([info[0] for info in infos], default=0)
+        return [
+            [
+                ws_id,
+                f"ws{ws_id}",
+                "user",
+                str(self.moddate),
+                max_id,
+                "r",
+                "n",
+                "unlocked",
+                {},
+            ]
+        ]
+
+    def save_objects(self, params):
+        infos = []
+        for o in params["objects"]:
+            ws_id = params.get("id", 1)
+            latest = self._lookup({"wsid": ws_id, "name": o["name"]})
+            obj_id, ver = len(self.objects) + 1, 1
+            if latest is not None:
+                obj_id, ver = latest["info"][0], latest["info"][4] + 1
+            info = make_info(ws_id, obj_id, o["name"], o["type"], ver)
+            info[8] = data_checksum(o["data"])
+            # auto metadata from the type spec (e.g., Number reactions of FBAModel)
+            info[10] = dict(o.get("meta") or {}, **{"Number keys": str(len(o["data"]))})
+            self.objects[f"{ws_id}/{obj_id}/{ver}"] = {"data": o["data"], "info": info}
+            infos.append(info)
+        self.moddate += 1
+        return [infos]
+
+    def copy_object(self, params):
+        source = self._lookup(params["from"])
+        if source is None:
+            raise KeyError("No object with such reference")
+        to = params["to"]
+        ws_id = to.get("wsid", to.get("workspace"))
+        obj_id = len(self.objects) + 1
+        info = make_info(ws_id, obj_id, to["name"], source["info"][2])
+        self.objects[f"{ws_id}/{obj_id}/1"] = {"data": source["data"], "info": info}
+        self.moddate += 1
+        return [info]
+
+    def persist_handle(self, handle):
+        hid = f"KBH_{len(self.handles) + 1}"
+        self.handles[hid] = dict(handle, hid=hid)
+        return [hid]
+
+    def create_node(self, form):
+        node_id = f"upload{len(self.uploads) + 1}"
+        self.uploads[node_id] = {
+            "parts": int(form["parts"]),
+            "file_name": form.get("file_name", b"").decode(),
+            "data": {},
+        }
+        return node_id
+
+    def put_part(self, node_id, form):
+        upload = self.uploads[node_id]
+        for part, content in form.items():
+            upload["data"][int(part)] = content
+        if len(upload["data"]) == upload["parts"]:
+            parts = sorted(upload["data"].items())
+            self.files[node_id] = b"".join(content for _, content in parts)
+
+    def handle(self, method, params):
+        self.calls.append(method)
+        self.requests.append((method, params))
+        name = method.split(".")[1]
+        if name == "hids_to_handles":
+            handles = []
+            # unknown handles are left out, the order is not the request order
+            for hid in sorted(h for h in params[0] if h in self.files):
+                md5 = hashlib.md5(self.files.get(hid, b"")).hexdigest()
+                handles.append(
+                    {
+                        "hid": hid,
+                        "id": hid,
+                        "file_name": self.file_names.get(hid, hid),
+                        "remote_md5": md5,
+                    }
+                )
+            return [handles]
+        return getattr(self, name)(*params)
+
+    def client(self):
+        """
+        In process client with the same interface as WorkspaceClient
+        """
+        stub = self
+
+        class Client:
+            def __getattr__(self, name):
+                def call(params):
+                    try:
+                        result = stub.handle(f"Workspace.{name}", [params])[0]
+                        # fresh copies as if decoded from a response
+                        return json.loads(json.dumps(result))
+                    except KeyError as e:
+                        raise ServerError("JSONRPCError", -32500, str(e))
+
+                return call
+
+        return Client()
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, content_type="application/json"):
+                self.send_response(code)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _node(self, node_id):
+                return {"data": {"id": node_id}, "status": 200}
+
+            def do_PUT(self):
+                node_id = self.path.split("/node/")[1]
+                body = self.rfile.read(int(self.headers["content-length"]))
+                form = parse_form(self.headers["content-type"], body)
+                stub.calls.append(("put", node_id, sorted(form)))
+                puts = [c for c in stub.calls if c[0] == "put"]
+                if stub.fail_after is not None and len(puts) > stub.fail_after:
+                    return self._send(500, b"{}")
+                stub.put_part(node_id, form)
+                self._send(200, json.dumps(self._node(node_id)).encode())
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["content-length"]))
+                if self.path.startswith("/node"):
+                    form = parse_form(self.headers["content-type"], body)
+                    node_id = stub.create_node(form)
+                    stub.calls.append(("create", node_id))
+                    return self._send(200, json.dumps(self._node(node_id)).encode())
+                request = json.loads(body)
+                try:
+                    result = stub.handle(request["method"], request["params"])
+                    self._send(200, json.dumps({"result": result}).encode())
+                except KeyError as e:
+                    error = {"name": "JSONRPCError", "code": -32500, "message": str(e)}
+                    self._send(500, json.dumps({"error": error}).encode())
+
+            def do_GET(self):
+                node_id = self.path.split("/node/")[1].split("?")[0]
+                if node_id not in stub.files:
+                    return self._send(404, b"{}")
+                content = stub.files[node_id]
+                if "download_raw" in self.path:
+                    stub.calls.append(("download", node_id, self.headers.get("Range")))
+                    if self.headers.get("Range"):
+                        start = int(self.headers["Range"][6:].split("-")[0])
+                        return self._send(
+                            206, content[start:], "application/octet-stream"
+                        )
+                    return self._send(200, content, "application/octet-stream")
+                stub.calls.append(("node", node_id))
+                node_file = {
+                    "name": stub.uploads.get(node_id, {}).get("file_name", node_id),
+                    "size": len(content),
+                    "checksum": {"md5": hashlib.md5(content).hexdigest()},
+                }
+                self._send(200, json.dumps({"data": {"file": node_file}}).encode())
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
@@ -0,0 +1,69 @@
+from cobra.core import Model
+from test_data.stub_server import WorkspaceStub, make_info
+from cobrakbase.kbaseapi import KBaseAPI
+from cobrakbase.exceptions import WorkspaceObjectError
+from cobrakbase.dependency_resolver import DependencyResolver, find_refs
+from cobrakbase.core.fba_utilities import KBaseFBAUtilities
+
+
+def _model(i, template_ref="2/1/1"):
+    return {
+        "id": f"model{i}",
+        "genome_ref": f"3/{i}/1",
+        "template_refs": [template_ref],
+        "gapfillings": [{"id": "gf.0", "media_ref": "4/1/1"}],
+        "modelreactions": [{"id": "rxn1", "reaction_ref": "~/template/reactions/id/r"}],
+    }
+
+
+def _stub():
+    objects = {}
+    for i in range(1, 4):
+        objects[f"1/{i}/1"] = {"data": _model(i), "info": make_info(1, i, f"m{i}")}
+        objects[f"3/{i}/1"] = {
+            "data": {"assembly_ref": "5/1/1"},
+            "info": make_info(3, i, f"g{i}"),
+        }
+    objects["2/1/1"] = {
+        "data": {"biochemistry_ref": "6/1/1"},
+        "info": make_info(2, 1, "t"),
+    }
+    objects["4/1/1"] = {"data": {}, "info": make_info(4, 1, "media")}
+    objects["5/1/1"] = {"data": {}, "info": make_info(5, 1, "assembly")}
+    stub = WorkspaceStub(objects)
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    return api, stub
+
+
+def test_find_refs():
+    assert find_refs(_model(1)) == ["3/1/1", "2/1/1", "4/1/1"]
+    assert find_refs(_model(1), ["template_refs"]) == ["2/1/1"]
+
+
+def test_resolve_depth_and_dedup():
+    api, stub = _stub()
+    resolver = DependencyResolver(api)
+    closure = resolver.resolve(["1/1/1", "1/2/1"])
+    assert set(closure) == {"1/1/1", "1/2/1", "3/1/1", "3/2/1", "2/1/1", "4/1/1"}
+    assert stub.calls.count("Workspace.get_objects2") == 2
+
+    # shared template and media are not fetched again
+    stub.calls.clear()
+    closure = resolver.resolve(["1/3/1"], max_depth=2)
+    assert "5/1/1" in closure
+    assert isinstance(closure["6/1/1"], WorkspaceObjectError)
+    assert stub.calls.count("Workspace.get_objects2") == 3
+
+
+def test_prefetch_dependencies():
+    api, stub = _stub()
+    fbamodel = api.get_from_ws("1/1/1")
+    stub.calls.clear()
+    utilities = KBaseFBAUtilities(Model("model1"), fbamodel, api)
+    prefetched = utilities.prefetch_dependencies()
+    # the gapfilling media (4/1/1) and the genome are not read when gapfilling
+    assert set(prefetched) == {"2/1/1"}
+    assert stub.calls.count("Workspace.get_objects2") == 1
+    assert utilities._get_ws_object("2/1/1") is prefetched["2/1/1"]
+    assert stub.calls.count("Workspace.get_objects2") == 1
@@ -0,0 +1,48 @@
+import json
+import pytest
+import requests
+from test_data.stub_server import WorkspaceStub, make_info
+from cobrakbase.kbaseapi import KBaseAPI
+from cobrakbase.Workspace.retry import RetryPolicy
+from cobrakbase.Workspace.transport import FaultInjectingTransport
+from cobrakbase.Workspace.instrumentation import CallStatsAggregator
+
+
+def test_call_stats(tmp_path):
+    objects = {"1/1/1": {"data": {"id": "obj1"}, "info": make_info(1, 1, "obj1")}}
+    stub = WorkspaceStub(objects, {"node1": b"ACGT" * 100})
+    url = stub.start()
+    try:
+        stats = CallStatsAggregator(keep_records=True)
+        transport = FaultInjectingTransport(
+            failure_rate=1, methods=["Workspace.get_object_info3"]
+        )
+        api = KBaseAPI(
+            config={"workspace-url": url, "shock-url": url},
+            public=True,
+            session=transport,
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0),
+            hooks=[stats],
+        )
+        api.get_from_ws("1/1/1")
+        api.get_from_ws("9/9/9")
+        with pytest.raises(requests.HTTPError):
+            api.get_object_info("1/1/1")
+        api.shock.download("node1", str(tmp_path / "f"))
+    finally:
+        stub.stop()
+
+    record = stats.records[0]
+    assert record.method == "Workspace.get_objects2"
+    assert record.bytes_sent > 0
+    assert record.bytes_received > 0
+    assert record.decode_time is not None
+    assert record.error_code is None
+
+    methods = json.loads(stats.to_json())["methods"]
+    assert methods["Workspace.get_objects2"]["calls"] == 2
+    assert methods["Workspace.get_objects2"]["errors"] == {"-32500": 1}
+    assert methods["Workspace.get_object_info3"]["retries"] == 1
+    assert methods["Workspace.get_object_info3"]["errors"] == {"503": 1}
+    assert methods["shock.download"]["bytes_received"] == 400
+    assert sum(methods["shock.download"]["latency_histogram"].values()) == 1
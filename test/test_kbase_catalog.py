@@ -0,0 +1,52 @@
+from test_data.stub_server import WorkspaceStub, make_info
+from cobrakbase.kbaseapi import KBaseAPI
+from cobrakbase.kbase_catalog import KBaseCatalog
+
+
+def _api():
+    objects = {}
+    for i, name in enumerate(["Carbon-D-Glucose", "Carbon-D-Fructose", "find"]):
+        info = make_info(1, i + 1, name, "KBaseBiochem.Media-4.0")
+        objects[f"1/{i + 1}/1"] = {"data": {"id": name}, "info": info}
+    info = make_info(1, 4, "template", "KBaseFBA.NewModelTemplate-1.0")
+    objects["1/4/1"] = {"data": {"id": "template"}, "info": info}
+    stub = WorkspaceStub(objects)
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    return api, stub
+
+
+def test_lazy_and_index():
+    api, stub = _api()
+    catalog = KBaseCatalog(api, 1)
+    assert stub.calls == []
+    assert catalog.Carbon_D_Glucose.info.id == "Carbon-D-Glucose"
+    assert len(catalog) == 4
+    assert [item.info.id for item in catalog._find(name_prefix="Carbon-")] == [
+        "Carbon-D-Fructose",
+        "Carbon-D-Glucose",
+    ]
+    assert len(catalog._find(object_type="KBaseBiochem.Media")) == 3
+    # catalog methods do not shadow workspace objects
+    assert catalog.find.info.id == "find"
+    media = catalog._get_many(["find", "Carbon-D-Glucose"])
+    assert [m.info.id for m in media] == ["find", "Carbon-D-Glucose"]
+
+
+def test_snapshot(tmp_path):
+    api, stub = _api()
+    assert len(KBaseCatalog(api, 1, snapshot_path=str(tmp_path))) == 4
+    stub.calls.clear()
+
+    # unchanged workspace, only the staleness check
+    assert len(KBaseCatalog(api, 1, snapshot_path=str(tmp_path))) == 4
+    assert stub.calls == ["Workspace.get_workspace_info"]
+    stub.calls.clear()
+    assert len(KBaseCatalog(api, 1, snapshot_path=str(tmp_path), snapshot_ttl=60)) == 4
+    assert stub.calls == []
+
+    api.save_object("new", 1, "KBaseBiochem.Media", {"id": "new"})
+    stub.calls.clear()
+    catalog = KBaseCatalog(api, 1, snapshot_path=str(tmp_path))
+    assert len(catalog) == 5
+    assert "Workspace.list_objects" in stub.calls
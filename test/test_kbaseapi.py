@@ -0,0 +1,345 @@
+import pytest
+import requests
+from test_data.stub_server import WorkspaceStub, make_info, make_objects
+from cobrakbase import kbaseapi
+from cobrakbase.kbaseapi import KBaseAPI
+from cobrakbase.exceptions import WorkspaceObjectError
+from cobrakbase.Workspace.retry import RetryPolicy
+from cobrakbase.Workspace.transport import FaultInjectingTransport
+
+
+def _api(objects):
+    stub = WorkspaceStub(objects)
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    return api, stub
+
+
+def _batches(stub):
+    # (method, number of objects) of every object request
+    return [
+        (method.split(".")[1], len(params[0]["objects"]))
+        for method, params in stub.requests
+        if method in ("Workspace.get_object_info3", "Workspace.get_objects2")
+    ]
+
+
+def _objects(n, size=10):
+    return make_objects(range(n), size=size)
+
+
+def test_get_from_ws_many_order_and_errors():
+    api, stub = _api(_objects(5))
+    refs = ["1/3/1", "1/0/1", "9/9/9", "1/4/1"]
+    res = api.get_from_ws_many(refs)
+    assert [o.info.id for o in (res[0], res[1], res[3])] == ["obj3", "obj0", "obj4"]
+    assert isinstance(res[2], WorkspaceObjectError)
+    assert res[2].ref == "9/9/9"
+    assert _batches(stub) == [("get_object_info3", 4), ("get_objects2", 3)]
+
+
+def test_get_from_ws_many_batches():
+    api, stub = _api(_objects(10, size=100))
+    api.get_from_ws_many([f"1/{i}/1" for i in range(10)], batch_size=4, max_bytes=250)
+    fetches = [n for method, n in _batches(stub) if method == "get_objects2"]
+    assert fetches == [2, 2, 2, 2, 2]
+
+
+def test_get_from_ws_many_transport_errors(workspace_stub, stub_url):
+    workspace_stub.objects.update(make_objects(range(4, 11)))
+    transport = FaultInjectingTransport(
+        failure_rate=0.5,
+        failure=requests.ConnectionError("connection reset"),
+        methods=["Workspace.get_objects2"],
+        seed=1,
+    )
+    api = KBaseAPI(
+        config={"workspace-url": stub_url},
+        public=True,
+        session=transport,
+        retry_policy=RetryPolicy(max_attempts=1, base_delay=0),
+    )
+    refs = [f"1/{i}/1" for i in range(1, 11)]
+    res = api.get_from_ws_many(refs, batch_size=2)
+    failed = [i for i, o in enumerate(res) if isinstance(o, WorkspaceObjectError)]
+    assert 0 < len(failed) == 2 * transport.injected < len(refs)
+    assert all(res[i].info.id == f"obj{i + 1}" for i in range(10) if i not in failed)
+
+    pytest.importorskip("ijson")
+    transport.injected = 0
+    res = list(api.iter_from_ws(refs, batch_size=2))
+    failed = [ref for ref, o in res if isinstance(o, WorkspaceObjectError)]
+    assert [ref for ref, _ in res] == refs
+    assert 0 < len(failed) == 2 * transport.injected < len(refs)
+
+
+def test_pack_batches_large_object_alone():
+    batches = KBaseAPI._pack_batches({0: 10, 1: 1000, 2: 10}, 10, 100)
+    assert batches == [[0], [1], [2]]
+
+
+def test_clients_share_session():
+    api = KBaseAPI(public=True, pool_size=4)
+    assert api.ws_client._client.session is api.session
+    assert api.hs._client.session is api.session
+    assert api.session.get_adapter("https://kbase.us")._pool_maxsize == 4
+
+
+def test_fetch_parallel():
+    api, _ = _api(_objects(20))
+    api._get_thread_ws_client = lambda: api.ws_client
+    refs = [f"1/{i}/1" for i in range(20)] + ["9/9/9"]
+    res = api.fetch_parallel(refs, workers=4)
+    assert [o.info.id for o in res[:20]] == [f"obj{i}" for i in range(20)]
+    assert isinstance(res[20], WorkspaceObjectError)
+
+
+def test_iter_parallel_yields_all():
+    api, _ = _api(_objects(10))
+    api._get_thread_ws_client = lambda: api.ws_client
+    refs = [f"1/{i}/1" for i in range(10)]
+    res = dict(api.iter_parallel(iter(refs), workers=3))
+    assert sorted(res) == sorted(refs)
+    assert res["1/7/1"].info.id == "obj7"
+
+
+def test_fetch_parallel_transport_errors(workspace_stub, stub_url):
+    workspace_stub.objects.update(make_objects(range(4, 21)))
+    transport = FaultInjectingTransport(
+        failure_rate=0.3, failure=requests.ConnectionError("connection reset"), seed=1
+    )
+    api = KBaseAPI(
+        config={"workspace-url": stub_url},
+        public=True,
+        session=transport,
+        retry_policy=RetryPolicy(max_attempts=1, base_delay=0),
+    )
+    refs = [f"1/{i}/1" for i in range(1, 21)]
+    res = api.fetch_parallel(refs, workers=4)
+    failed = [i for i, o in enumerate(res) if isinstance(o, WorkspaceObjectError)]
+    assert 0 < len(failed) == transport.injected
+    assert all(res[i].ref == refs[i] for i in failed)
+    assert [res[i].info.id for i in range(20) if i not in failed] == [
+        f"obj{i + 1}" for i in range(20) if i not in failed
+    ]
+
+
+def _genome_data():
+    return {
+        "id": "g",
+        "scientific_name": "E. coli",
+        "domain": "Bacteria",
+        "genome_tiers": [],
+        "feature_counts": {},
+        "genetic_code": 11,
+        "dna_size": 10,
+        "num_contigs": 1,
+        "molecule_type": "DNA",
+        "source": "RefSeq",
+        "md5": "md5",
+        "gc_content": 0.5,
+        "features": [
+            {
+                "id": "f1",
+                "functions": ["Hypothetical protein"],
+                "location": [["c1", 1, "+", 9]],
+                "cdss": ["f1_CDS_1"],
+                "protein_translation": "MMM",
+                "dna_sequence": "ATGATGATG",
+            }
+        ],
+        "cdss": [
+            {
+                "id": "f1_CDS_1",
+                "location": [["c1", 1, "+", 9]],
+                "protein_translation": "MMM",
+            }
+        ],
+    }
+
+
+def test_get_from_ws_projection():
+    info = make_info(1, 1, "g", "KBaseGenomes.Genome-17.0")
+    stub = WorkspaceStub({"1/1/1": {"data": _genome_data(), "info": info}})
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    genome = api.get_from_ws("1/1/1", projection="genome-functions-only")
+    assert genome.features.get_by_id("f1").functions == {"Hypothetical protein"}
+    assert genome.features.get_by_id("f1").seq is None
+    assert len(genome.cdss) == 0
+
+    # builders that cannot handle the subset fall back to KBaseObject
+    o = api.get_from_ws("1/1/1", included=["id", "features/[*]/id"])
+    assert o.features == [{"id": "f1"}]
+
+
+def test_unknown_projection():
+    with pytest.raises(ValueError):
+        KBaseAPI(public=True).get_from_ws("1/1/1", projection="missing")
+
+
+class BrokenObject:
+    def get_data(self):
+        raise ValueError("broken")
+
+
+def test_save_many():
+    stub = WorkspaceStub()
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    objects = [(f"obj{i}", "KBaseTest.Object", {"id": "x" * 40}) for i in range(5)]
+    objects.insert(2, ("broken", "KBaseTest.Object", BrokenObject()))
+    infos = api.save_many(objects, 1, workers=2, batch_size=10, max_bytes=100)
+    assert stub.calls.count("Workspace.save_objects") == 3
+    assert isinstance(infos[2], WorkspaceObjectError)
+    assert [info.id for i, info in enumerate(infos) if i != 2] == [
+        "obj0",
+        "obj1",
+        "obj2",
+        "obj3",
+        "obj4",
+    ]
+
+
+def test_save_many_connection_error():
+    stub = WorkspaceStub()
+    api = KBaseAPI(public=True)
+    client = stub.client()
+    calls = []
+
+    class Client:
+        def save_objects(self, params):
+            calls.append(params)
+            if len(calls) == 2:
+                raise requests.ConnectionError("connection reset")
+            return client.save_objects(params)
+
+    api.ws_client = Client()
+    objects = [(f"obj{i}", "KBaseTest.Object", {"id": i}) for i in range(3)]
+    infos = api.save_many(objects, 1, workers=1, batch_size=1)
+    assert isinstance(infos[1], WorkspaceObjectError)
+    assert "connection reset" in str(infos[1])
+    assert [infos[0].id, infos[2].id] == ["obj0", "obj2"]
+
+
+def test_stream(workspace_stub, stub_url):
+    pytest.importorskip("ijson")
+    for o in workspace_stub.objects.values():
+        o["data"]["v"] = 0.5
+    api = KBaseAPI(config={"workspace-url": stub_url}, public=True)
+    res = list(api.iter_from_ws(["1/1/1", "9/9/9", "1/3/1"], batch_size=2))
+    assert [ref for ref, _ in res] == ["1/1/1", "9/9/9", "1/3/1"]
+    assert res[0][1].id == "obj1"
+    assert res[0][1].v == 0.5
+    assert isinstance(res[1][1], WorkspaceObjectError)
+    assert res[2][1].id == "obj3"
+
+    many = api.get_from_ws_many(["1/2/1", "9/9/9"], stream=True)
+    assert many[0].id == "obj2"
+    assert isinstance(many[1], WorkspaceObjectError)
+    assert api.get_from_ws("1/3/1", stream=True).id == "obj3"
+    assert api.get_from_ws("9/9/9", stream=True) is None
+
+
+def test_iter_objects(monkeypatch):
+    objects = make_objects(range(1, 8))
+    objects["2/1/1"] = {"data": {}, "info": make_info(2, 1, "other")}
+    stub = WorkspaceStub(objects)
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    infos = list(api.iter_objects(1, page_size=3))
+    assert [info.id for info in infos] == [f"obj{i}" for i in range(1, 8)]
+    assert stub.calls.count("Workspace.list_objects") == 3
+
+    # page sizes over the server cap are clamped instead of ending after the first page
+    monkeypatch.setattr(kbaseapi, "MAX_PAGE_SIZE", 3)
+    list_objects = stub.list_objects
+    stub.list_objects = lambda params: [list_objects(params)[0][:3]]
+    assert len(list(api.iter_objects(1, page_size=5))) == 7
+
+
+def test_get_object_infos_batches_and_caches():
+    api, stub = _api(_objects(5))
+    refs = ["1/3/1", "9/9/9", "1/0/1", "1/3/1"]
+    infos = api.get_object_infos(refs, batch_size=2)
+    assert [infos[0].id, infos[2].id, infos[3].id] == ["obj3", "obj0", "obj3"]
+    assert isinstance(infos[1], WorkspaceObjectError)
+    assert _batches(stub) == [("get_object_info3", 2), ("get_object_info3", 1)]
+    stub.requests.clear()
+    assert api.get_object_info("1/0/1").id == "obj0"
+    api.get_from_ws_many(["1/3/1", "1/4/1"])
+    assert _batches(stub) == [("get_object_info3", 1), ("get_objects2", 2)]
+
+
+def test_copy_many(workspace_stub, stub_url):
+    api = KBaseAPI(config={"workspace-url": stub_url}, public=True)
+    pairs = [("1/1/1", 2), ("1/2/1", 2, "renamed"), ("9/9/9", 2), ("1/3/1", 2)]
+    infos = api.copy_many(pairs, workers=2)
+    assert [infos[i].id for i in (0, 1, 3)] == ["obj1", "renamed", "obj3"]
+    assert all(infos[i].workspace_uid == 2 for i in (0, 1, 3))
+    assert isinstance(infos[2], WorkspaceObjectError)
+    assert workspace_stub.calls.count("Workspace.copy_object") == 3
+    assert workspace_stub.calls.count("Workspace.get_objects2") == 0
+    assert api.copy("1/1/1", None, "single", 3).id == "single"
+
+
+def test_copy_many_transport_errors(workspace_stub, stub_url):
+    workspace_stub.objects.update(make_objects(range(4, 21)))
+    transport = FaultInjectingTransport(
+        failure_rate=0.3,
+        failure=requests.ConnectionError("connection reset"),
+        methods=["Workspace.copy_object"],
+        seed=1,
+    )
+    api = KBaseAPI(
+        config={"workspace-url": stub_url},
+        public=True,
+        session=transport,
+        retry_policy=RetryPolicy(max_attempts=2, base_delay=0),
+    )
+    infos = api.copy_many([(f"1/{i}/1", 2) for i in range(1, 21)], workers=4)
+    failed = [info for info in infos if isinstance(info, WorkspaceObjectError)]
+    assert 0 < len(failed) == transport.injected
+    assert "connection reset" in str(failed[0])
+    copied = len(infos) - len(failed)
+    assert copied == workspace_stub.calls.count("Workspace.copy_object")
+
+
+def test_save_object_skip_if_unchanged():
+    stub = WorkspaceStub()
+    api = KBaseAPI(public=True)
+    api.ws_client = stub.client()
+    data = {"id": "m", "reactions": [{"id": "rxn1", "v": 1.5}]}
+    first = api.save_object("m", 1, "KBaseTest.Object", data, skip_if_unchanged=True)
+    same = api.save_object("m", 1, "KBaseTest.Object", data, skip_if_unchanged=True)
+    assert str(same) == str(first)
+    assert stub.calls.count("Workspace.save_objects") == 1
+    changed = api.save_object(
+        "m", 1, "KBaseTest.Object", dict(data, id="m2"), skip_if_unchanged=True
+    )
+    assert changed.version == 2
+    # checksums computed differently by the server, the digest of our save is used
+    stub.objects[changed.reference]["info"][8] = "other"
+    again = api.save_object(
+        "m", 1, "KBaseTest.Object", dict(data, id="m2"), skip_if_unchanged=True
+    )
+    assert str(again) == str(changed)
+    api.save_object("m", 1, "KBaseTest.Object", data, {"k": "v"}, True)
+    assert stub.calls.count("Workspace.save_objects") == 3
+
+    # another instance (no local digests): server checksum, auto metadata is ignored
+    other = KBaseAPI(public=True)
+    other.ws_client = stub.client()
+    latest = other.save_object("m", 1, "KBaseTest.Object", data, {"k": "v"}, True)
+    assert latest.version == 3 and "Number keys" in latest.metadata
+    assert str(other.save_object("m", 1, None, data, {}, True)) == str(latest)
+    assert stub.calls.count("Workspace.save_objects") == 3
+
+
+def test_build_errors_are_per_object():
+    objects = _objects(3)
+    objects["1/1/1"]["info"][2] = "KBaseGenomes.Genome-17.0"
+    api, _ = _api(objects)
+    res = api.get_from_ws_many(["1/0/1", "1/1/1", "1/2/1"])
+    assert isinstance(res[1], WorkspaceObjectError) and res[1].ref == "1/1/1"
+    assert [res[0].id, res[2].id] == ["obj0", "obj2"]
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from test_data.stub_server import WorkspaceStub, make_objects
+from cobrakbase.kbaseapi_async import AsyncKBaseAPI
+from cobrakbase.exceptions import WorkspaceObjectError
+
+
+@pytest.fixture
+def workspace_stub():
+    return WorkspaceStub(make_objects(range(1, 6)), {"node1": b"ACGT" * 1000})
+
+
+@pytest.fixture
+def config(stub_url):
+    return {"workspace-url": stub_url, "handle-url": stub_url, "shock-url": stub_url}
+
+
+def _run(config, fn):
+    async def main():
+        async with AsyncKBaseAPI(config=config, public=True) as api:
+            return await fn(api)
+
+    return asyncio.run(main())
+
+
+def test_get_from_ws(config):
+    o = _run(config, lambda api: api.get_from_ws("1/2/1"))
+    assert o.info.id == "obj2"
+    assert _run(config, lambda api: api.get_from_ws("9/9/9")) is None
+
+
+def test_get_from_ws_many(config):
+    refs = ["1/3/1", "9/9/9", "1/1/1"]
+    res = _run(config, lambda api: api.get_from_ws_many(refs, concurrency=2))
+    assert res[0].info.id == "obj3"
+    assert isinstance(res[1], WorkspaceObjectError)
+    assert res[2].info.id == "obj1"
+
+
+def test_info_list_and_save(workspace_stub, config):
+    info = _run(config, lambda api: api.get_object_info("1/4/1"))
+    assert info.id == "obj4"
+    listing = _run(config, lambda api: api.list_objects(1))
+    assert len(listing) == 5
+    params = {
+        "id": 1,
+        "objects": [{"name": "new", "type": "KBaseTest.Object", "data": {}}],
+    }
+    saved = _run(config, lambda api: api.save_objects(params))
+    assert saved[0][1] == "new"
+    assert "Workspace.save_objects" in workspace_stub.calls
+
+
+def test_download_file(config, tmp_path):
+    path = _run(
+        config, lambda api: api.download_file_from_kbase("node1", str(tmp_path))
+    )
+    with open(path, "rb") as fh:
+        assert fh.read() == b"ACGT" * 1000
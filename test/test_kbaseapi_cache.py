@@ -0,0 +1,177 @@
+import os
+import time
+import hashlib
+import multiprocessing
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from test_data.stub_server import WorkspaceStub, make_info, make_objects
+from cobrakbase.kbaseapi_cache import KBaseCache
+from cobrakbase.object_cache import ObjectMemoryCache
+from cobrakbase.exceptions import WorkspaceObjectError
+
+
+def _cache(stub, path):
+    cache = KBaseCache("token", path=str(path))
+    cache.ws_client = stub.client()
+    return cache
+
+
+def test_immutable_ref_skips_info(workspace_stub, tmp_path):
+    _cache(workspace_stub, tmp_path).get_from_ws("1/2/1")
+    assert workspace_stub.calls == ["Workspace.get_objects2"]
+    workspace_stub.calls.clear()
+    o = _cache(workspace_stub, tmp_path).get_from_ws("1/2/1")
+    assert o.info.id == "obj2"
+    assert workspace_stub.calls == []
+
+
+def test_name_resolution_ttl(workspace_stub, tmp_path):
+    cache = _cache(workspace_stub, tmp_path)
+    cache.get_from_ws("obj3", 1)
+    cache.get_from_ws("obj3", 1)
+    assert workspace_stub.calls == [
+        "Workspace.get_object_info3",
+        "Workspace.get_objects2",
+    ]
+    cache.resolve_ttl = 0
+    cache._resolved.clear()
+    cache.get_from_ws("obj3", 1)
+    cache.get_from_ws("obj3", 1)
+    assert workspace_stub.calls.count("Workspace.get_object_info3") == 3
+    assert workspace_stub.calls.count("Workspace.get_objects2") == 1
+
+
+def test_missing_object(workspace_stub, tmp_path):
+    assert _cache(workspace_stub, tmp_path).get_from_ws("1/9/1") is None
+
+
+def test_stream(stub_url, tmp_path):
+    pytest.importorskip("ijson")
+    cache = KBaseCache("token", config={"workspace-url": stub_url}, path=str(tmp_path))
+    assert cache.get_from_ws("1/2/1", stream=True).id == "obj2"
+    assert cache.get_from_ws("1/3/1", included=["id"], stream=True).id == "obj3"
+    assert cache.get_from_ws("1/2/1", stream=True).id == "obj2"
+    assert len(cache.find_cached()) == 1
+
+
+def test_memory_cache(workspace_stub, tmp_path):
+    cache = _cache(workspace_stub, tmp_path)
+    cache.memory_cache = ObjectMemoryCache(mode="shared")
+    o = cache.get_from_ws("1/1/1")
+    assert cache.get_from_ws("1/1/1") is o
+    assert cache.memory_cache.hits == 1
+
+
+def test_subset_not_stored(workspace_stub, tmp_path):
+    cache = _cache(workspace_stub, tmp_path)
+    o = cache.get_from_ws("1/2/1", included=["id"])
+    assert o.id == "obj2"
+    assert cache.find_cached() == []
+
+
+def _fetch_in_process(url, path, ref):
+    cache = KBaseCache("token", config={"workspace-url": url}, path=path)
+    return cache.get_from_ws(ref).id
+
+
+def test_single_flight_across_processes(workspace_stub, stub_url, tmp_path):
+    get_objects2 = workspace_stub.get_objects2
+
+    def slow_get_objects2(params):
+        time.sleep(0.3)
+        return get_objects2(params)
+
+    workspace_stub.get_objects2 = slow_get_objects2
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4) as pool:
+        args = [(stub_url, str(tmp_path), "1/2/1")] * 4
+        assert pool.starmap(_fetch_in_process, args) == ["obj2"] * 4
+    assert workspace_stub.calls.count("Workspace.get_objects2") == 1
+
+
+def test_single_flight_get_from_ws_many(workspace_stub, tmp_path):
+    get_objects2 = workspace_stub.get_objects2
+
+    def slow_get_objects2(params):
+        time.sleep(0.3)
+        return get_objects2(params)
+
+    workspace_stub.get_objects2 = slow_get_objects2
+    refs = ["1/1/1", "1/2/1", "1/3/1"]
+    caches = [_cache(workspace_stub, tmp_path) for _ in range(3)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(c.get_from_ws_many, refs) for c in caches[:2]]
+        futures.append(executor.submit(caches[2].get_from_ws, "1/2/1"))
+        res = [future.result() for future in futures]
+    assert [o.id for o in res[0]] == [o.id for o in res[1]] == ["obj1", "obj2", "obj3"]
+    assert res[2].id == "obj2"
+    fetched = [
+        spec["ref"]
+        for method, params in workspace_stub.requests
+        if method == "Workspace.get_objects2"
+        for spec in params[0]["objects"]
+    ]
+    assert sorted(fetched) == refs
+
+
+def test_warmup_and_bundle(tmp_path):
+    objects = {
+        "1/1/1": {"data": {"id": "model", "template_ref": "2/1/1"}},
+        "2/1/1": {"data": {"id": "template", "biochemistry_ref": "3/1/1"}},
+        "3/1/1": {"data": {"id": "biochem"}},
+    }
+    for ref, o in objects.items():
+        ws_id, obj_id, _ = map(int, ref.split("/"))
+        o["info"] = make_info(ws_id, obj_id, o["data"]["id"])
+        o["info"][8] = hashlib.md5(ref.encode()).hexdigest()
+    stub = WorkspaceStub(objects)
+    cache = _cache(stub, tmp_path / "online")
+    cached = cache.warmup(["1/1/1", "9/9/9"])
+    assert [cached[0], cached[2]] == ["1/1/1", "2/1/1"]
+    assert isinstance(cached[1], WorkspaceObjectError)
+    assert stub.calls.count("Workspace.get_objects2") == 2
+    bundle = str(tmp_path / "bundle.tar")
+    assert sorted(cache.export_bundle(bundle)) == ["1/1/1", "2/1/1"]
+
+    empty = WorkspaceStub()
+    offline = _cache(empty, tmp_path / "offline")
+    assert sorted(offline.import_bundle(bundle)) == ["1/1/1", "2/1/1"]
+    assert offline.get_from_ws("2/1/1").id == "template"
+    assert [o.id for o in offline.get_from_ws_many(["1/1/1", "2/1/1"])] == [
+        "model",
+        "template",
+    ]
+    assert empty.calls == []
+    assert len(offline.find_cached()) == 2
+
+
+def _blob_path(cache, ref):
+    entry = cache.store.read_entry_meta(*map(int, ref.split("/")))
+    return cache.store.blob_path(entry["checksum"])
+
+
+def test_corrupt_entry_refetched(workspace_stub, tmp_path):
+    cache = _cache(workspace_stub, tmp_path)
+    cache.get_from_ws("1/1/1")
+    with open(_blob_path(cache, "1/1/1"), "r+b") as fh:
+        fh.truncate(5)
+    assert cache.get_from_ws("1/1/1").id == "obj1"
+    assert workspace_stub.calls.count("Workspace.get_objects2") == 2
+    assert os.listdir(tmp_path / "quarantine")
+
+
+def test_check_integrity(workspace_stub, tmp_path):
+    cache = _cache(workspace_stub, tmp_path)
+    cache.get_from_ws_many(["1/1/1", "1/2/1", "1/3/1"])
+    with open(_blob_path(cache, "1/2/1"), "wb") as fh:
+        # decodes but does not match the digest
+        fh.write(cache.store.codec.encode({"id": "other"}))
+    with open(cache.store.entry_path(1, 3, 1), "w") as fh:
+        fh.write('{"info": [')
+    del workspace_stub.objects["1/3/1"]
+    report = cache.check_integrity(workers=2)
+    assert report["checked"] == 3
+    assert sorted(report["corrupt"]) == ["1/2/1", "1/3/1"]
+    assert report["repaired"] == ["1/2/1"] and list(report["failed"]) == ["1/3/1"]
+    assert cache.store.verify_entry(1, 2, 1) is None
+    assert cache.check_integrity()["corrupt"] == {}
@@ -0,0 +1,58 @@
+import pytest
+from cobrakbase.object_cache import ObjectMemoryCache
+
+
+class Unpicklable:
+    def __init__(self):
+        self.values = [1, 2]
+        self.fn = lambda: None
+
+    def __deepcopy__(self, memo):
+        o = Unpicklable.__new__(Unpicklable)
+        o.values = list(self.values)
+        o.fn = self.fn
+        return o
+
+
+def test_copy_mode_returns_copies():
+    cache = ObjectMemoryCache(mode="copy")
+    cache.put("1/1/1", {"a": [1]})
+    o = cache.get("1/1/1")
+    o["a"].append(2)
+    assert cache.get("1/1/1") == {"a": [1]}
+    assert cache.hits == 2
+
+
+def test_copy_mode_deepcopy_fallback():
+    cache = ObjectMemoryCache(mode="copy")
+    cache.put("1/1/1", Unpicklable(), 10)
+    o = cache.get("1/1/1")
+    o.values.append(3)
+    assert cache.get("1/1/1").values == [1, 2]
+
+
+def test_shared_mode_returns_instance():
+    cache = ObjectMemoryCache(mode="shared")
+    o = {"a": 1}
+    cache.put("1/1/1", o, 10)
+    assert cache.get("1/1/1") is o
+    assert cache.get("1/2/1") is None
+    assert cache.misses == 1
+
+
+def test_lru_bound():
+    cache = ObjectMemoryCache(max_bytes=25, mode="shared")
+    for i in range(3):
+        cache.put(f"1/{i}/1", i, 10)
+    assert "1/0/1" not in cache
+    cache.get("1/1/1")
+    cache.put("1/3/1", 3, 10)
+    assert "1/1/1" in cache and "1/2/1" not in cache
+    assert cache.size == 20
+    cache.put("1/4/1", 4, 100)
+    assert "1/4/1" not in cache
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        ObjectMemoryCache(mode="readonly")
@@ -0,0 +1,137 @@
+import os
+import pytest
+from test_data.stub_server import WorkspaceStub
+from cobrakbase.kbaseapi import KBaseAPI
+from cobrakbase.shock import ShockClient, RateLimiter
+from cobrakbase.exceptions import ShockException
+
+CONTENT = os.urandom(100000)
+
+
+@pytest.fixture
+def stub():
+    stub = WorkspaceStub(files={"node1": CONTENT, "node2": CONTENT[:500]})
+    url = stub.start()
+    yield stub, url
+    stub.stop()
+
+
+def test_download_to_directory(stub, tmp_path):
+    ws_stub, url = stub
+    path = ShockClient(url, chunk_size=4096).download("node1", str(tmp_path))
+    assert path == str(tmp_path / "node1")
+    assert open(path, "rb").read() == CONTENT
+    assert not os.path.exists(path + ".part")
+
+
+def test_download_resume(stub, tmp_path):
+    ws_stub, url = stub
+    path = str(tmp_path / "out")
+    with open(path + ".part", "wb") as fh:
+        fh.write(CONTENT[:1234])
+    ShockClient(url).download("node1", path)
+    assert open(path, "rb").read() == CONTENT
+    assert ("download", "node1", "bytes=1234-") in ws_stub.calls
+
+
+def test_download_checksum_mismatch(stub, tmp_path):
+    _, url = stub
+    path = str(tmp_path / "out")
+    with pytest.raises(ShockException):
+        ShockClient(url).download("node1", path, md5="0" * 32)
+    assert not os.path.exists(path) and not os.path.exists(path + ".part")
+
+
+def test_download_files_from_kbase(stub, tmp_path):
+    ws_stub, url = stub
+    api = KBaseAPI(
+        public=True,
+        config={"workspace-url": url, "handle-url": url, "shock-url": url},
+    )
+    ws_stub.file_names = {"node1": "genome.fa", "node2": "genome.fa"}
+    paths = api.download_files_from_kbase(
+        ["node2", "missing", "node1"], str(tmp_path), workers=2
+    )
+    assert open(paths[0], "rb").read() == CONTENT[:500]
+    assert isinstance(paths[1], ShockException)
+    assert open(paths[2], "rb").read() == CONTENT
+    assert sorted(os.listdir(tmp_path)) == ["genome.fa", "genome_1.fa"]
+    assert ws_stub.calls.count("AbstractHandle.hids_to_handles") == 1
+    assert not [c for c in ws_stub.calls if c[0] == "node"]
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(1000000)
+    limiter.consume(10)
+    assert limiter._allowance < 1000000
+
+
+def test_upload_parts(stub, tmp_path):
+    ws_stub, url = stub
+    path = tmp_path / "genome.fa"
+    path.write_bytes(CONTENT)
+    state = tmp_path / "state"
+    client = ShockClient(url, chunk_size=30000, upload_state_path=str(state))
+    node = client.upload(str(path))
+    assert ws_stub.files[node["id"]] == CONTENT
+    assert node["file_name"] == "genome.fa" and node["size"] == len(CONTENT)
+    assert len([c for c in ws_stub.calls if c[0] == "put"]) == 4
+    assert os.listdir(state) == []
+    assert sorted(os.listdir(tmp_path)) == ["genome.fa", "state"]
+
+
+def test_upload_no_resume_read_only(stub, tmp_path):
+    ws_stub, url = stub
+    data = tmp_path / "data"
+    data.mkdir()
+    path = data / "genome.fa"
+    path.write_bytes(CONTENT)
+    data.chmod(0o555)
+    state = tmp_path / "state"
+    try:
+        client = ShockClient(url, chunk_size=30000, upload_state_path=str(state))
+        node = client.upload(str(path), resume=False)
+    finally:
+        data.chmod(0o755)
+    assert ws_stub.files[node["id"]] == CONTENT
+    assert not state.exists()
+    assert os.listdir(data) == ["genome.fa"]
+
+
+def test_upload_resume(stub, tmp_path):
+    ws_stub, url = stub
+    path = tmp_path / "genome.fa"
+    path.write_bytes(CONTENT)
+    state = tmp_path / "state"
+    client = ShockClient(url, chunk_size=30000, upload_state_path=str(state))
+    ws_stub.fail_after = 2
+    with pytest.raises(ShockException):
+        client.upload(str(path))
+    assert len(os.listdir(state)) == 1
+    ws_stub.fail_after = None
+    node = client.upload(str(path))
+    assert ws_stub.files[node["id"]] == CONTENT
+    puts = [c[2] for c in ws_stub.calls if c[0] == "put"]
+    assert puts == [["1"], ["2"], ["3"], ["3"], ["4"]]
+    assert len([c for c in ws_stub.calls if c[0] == "create"]) == 1
+
+
+def test_upload_files_to_kbase(stub, tmp_path):
+    ws_stub, url = stub
+    api = KBaseAPI(
+        public=True,
+        config={"workspace-url": url, "handle-url": url, "shock-url": url},
+    )
+    api.shock.upload_state_path = str(tmp_path / "state")
+    paths = []
+    for i, content in enumerate([CONTENT, CONTENT[:500], b""]):
+        paths.append(tmp_path / f"f{i}")
+        paths[-1].write_bytes(content)
+    handles = api.upload_files_to_kbase(
+        [str(p) for p in paths] + [str(tmp_path / "missing")], workers=2
+    )
+    assert isinstance(handles[3], ShockException)
+    for path, handle in zip(paths, handles):
+        assert ws_stub.handles[handle["hid"]]["id"] == handle["id"]
+        assert ws_stub.files[handle["id"]] == path.read_bytes()
+        assert handle["file_name"] == path.name
@@ -0,0 +1,43 @@
+import pytest
+import requests
+from cobrakbase.kbaseapi import KBaseAPI
+from cobrakbase.Workspace.retry import RetryPolicy
+from cobrakbase.Workspace.transport import (
+    RecordingTransport,
+    ReplayTransport,
+    FaultInjectingTransport,
+    ReplayMissError,
+)
+
+CONFIG = {"workspace-url": "http://localhost:1/ws"}
+
+
+def test_record_replay(workspace_stub, stub_url, tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    config = {"workspace-url": stub_url}
+    api = KBaseAPI(config=config, public=True, session=RecordingTransport(path))
+    assert api.get_from_ws("1/2/1").id == "obj2"
+    assert api.get_from_ws("9/9/9") is None
+    workspace_stub.stop()
+
+    api = KBaseAPI(config=CONFIG, public=True, session=ReplayTransport(path))
+    assert api.get_from_ws("1/2/1").id == "obj2"
+    assert api.get_from_ws("9/9/9") is None
+    with pytest.raises(ReplayMissError):
+        api.get_from_ws("1/3/1")
+
+
+def test_fault_injection(stub_url):
+    config = {"workspace-url": stub_url}
+    transport = FaultInjectingTransport(failure_rate=0.5, seed=1)
+    policy = RetryPolicy(max_attempts=10, base_delay=0)
+    api = KBaseAPI(config=config, public=True, session=transport, retry_policy=policy)
+    for i in range(1, 4):
+        assert api.get_from_ws(f"1/{i}/1").id == f"obj{i}"
+    assert transport.injected > 0
+
+    transport.failure = requests.ConnectionError()
+    transport.failure_rate = 1
+    api.retry_policy.max_attempts = 2
+    with pytest.raises(requests.ConnectionError):
+        api.get_from_ws("1/1/1")